@@ -1,7 +1,10 @@
-import threading
-from flask import Flask, request, jsonify
+import os
+import json
+import logging
+from flask import Flask, Response, request, jsonify, stream_with_context
 from .db import BidTaskRegistryDB, BidRegistryDB, BidTaskResultsRegistry
-from .evaluator import BidsEvaluator
+from .evaluation_jobs import get_job_manager
+from .evaluation_scheduler import get_scheduler
 from .submissions import submit_bid, create_bidding_task
 
 app = Flask(__name__)
@@ -19,6 +22,47 @@ def response(success, data=None, message=None):
         return jsonify({"success": False, "message": message})
 
 
+def wants_pagination():
+    return any(name in request.args for name in ("limit", "cursor", "fields", "sort"))
+
+
+def wants_stream():
+    return request.args.get("format") == "ndjson" or \
+        "application/x-ndjson" in request.headers.get("Accept", "")
+
+
+def listing_params():
+    fields = request.args.get("fields")
+    return {
+        "limit": request.args.get("limit", type=int),
+        "cursor": request.args.get("cursor"),
+        "fields": [field.strip() for field in fields.split(",") if field.strip()] if fields else None,
+        "sort": request.args.get("sort"),
+    }
+
+
+def ndjson_response(documents):
+    def generate():
+        try:
+            for document in documents:
+                yield json.dumps(document, default=str) + "\n"
+        except Exception as e:
+            # the status line is already sent, so the failure is reported in-band
+            logging.error(f"Streaming response failed: {e}")
+            yield json.dumps({"success": False, "message": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def listing(query, page, stream):
+    # ?limit/cursor/fields/sort return one keyset page, ?format=ndjson streams every match
+    params = listing_params()
+    if wants_stream():
+        return ndjson_response(stream(query, **params))
+    documents, next_cursor = page(query, **params)
+    return jsonify({"success": True, "data": documents, "next_cursor": next_cursor})
+
+
 # BidTaskRegistryDB APIs
 @app.route('/bid-tasks/<string:bid_task_id>', methods=['GET'])
 def get_bid_task(bid_task_id):
@@ -36,6 +80,9 @@ def update_bid_task(bid_task_id):
     try:
         updated_data = request.json
         if bid_task_db.update_bid_task(bid_task_id, updated_data):
+            if "bid_task_expiry_time" in updated_data:
+                get_scheduler().schedule(
+                    bid_task_id, updated_data["bid_task_expiry_time"])
             return response(True, data="Bid task updated successfully")
         return response(False, message="Bid task not found")
     except Exception as e:
@@ -55,6 +102,8 @@ def delete_bid_task(bid_task_id):
 @app.route('/bid-tasks', methods=['GET'])
 def list_bid_tasks():
     try:
+        if wants_pagination() or wants_stream():
+            return listing({}, bid_task_db.page_bid_tasks, bid_task_db.stream_bid_tasks)
         bid_tasks = bid_task_db.list_bid_tasks()
         return response(True, [task.to_dict() for task in bid_tasks])
     except Exception as e:
@@ -65,6 +114,8 @@ def list_bid_tasks():
 def query_bid_tasks():
     try:
         query = request.json
+        if wants_pagination() or wants_stream():
+            return listing(query, bid_task_db.page_bid_tasks, bid_task_db.stream_bid_tasks)
         bid_tasks = bid_task_db.query_bid_tasks(query)
         return response(True, [task.to_dict() for task in bid_tasks])
     except Exception as e:
@@ -107,6 +158,8 @@ def delete_bid(bid_id):
 @app.route('/bids', methods=['GET'])
 def list_bids():
     try:
+        if wants_pagination() or wants_stream():
+            return listing({}, bid_db.page_bids, bid_db.stream_bids)
         bids = bid_db.list_bids()
         return response(True, [bid.to_dict() for bid in bids])
     except Exception as e:
@@ -117,6 +170,8 @@ def list_bids():
 def query_bids():
     try:
         query = request.json
+        if wants_pagination() or wants_stream():
+            return listing(query, bid_db.page_bids, bid_db.stream_bids)
         bids = bid_db.query_bids(query)
         return response(True, [bid.to_dict() for bid in bids])
     except Exception as e:
@@ -137,7 +192,9 @@ def get_result(result_id):
 @app.route("/bid-task-results", methods=["GET"])
 def query_results():
     try:
-        query = request.json or {}
+        query = request.get_json(silent=True) or {}
+        if wants_pagination() or wants_stream():
+            return listing(query, results_registry.page_results, results_registry.stream_results)
         results = results_registry.query_results(query)
         return jsonify({"success": True, "data": [result.to_dict() for result in results]}), 200
     except Exception as e:
@@ -198,17 +255,44 @@ def submit_bid_entry():
 @app.route("/bid-task/<bid_task_id>/start-evaluation", methods=["POST"])
 def start_evaluation(bid_task_id):
     try:
-        def evaluate_task():
-            evaluator = BidsEvaluator(bid_task_id)
-            evaluator.evaluate()
+        bid_task = bid_task_db.get_bid_task(bid_task_id)
+        if not bid_task:
+            return jsonify({"success": False, "message": "Bid task not found"}), 404
+        # goes through the scheduler's claim, so replicas and the expiry trigger never run it twice
+        job, created = get_scheduler().request_evaluation(bid_task)
+        if job is None:
+            return jsonify({"success": False, "message": f"Evaluation for BidTask {bid_task_id} is being started by another replica."}), 409
+        message = f"Evaluation for BidTask {bid_task_id} has been queued." if created else \
+            f"Evaluation for BidTask {bid_task_id} is already {job.status}."
+        return jsonify({"success": True, "message": message, "data": job.to_dict()}), 202
+
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
 
-        thread = threading.Thread(target=evaluate_task)
-        thread.start()
+@app.route("/bid-task/<bid_task_id>/evaluation", methods=["GET"])
+def get_evaluation_status(bid_task_id):
+    try:
+        job = get_job_manager().get_task_job(bid_task_id)
+        if not job:
+            return jsonify({"success": False, "message": "No evaluation found for this bid task"}), 404
+        return jsonify({"success": True, "data": job.to_dict()}), 200
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
 
-        return jsonify({"success": True, "message": f"Evaluation for BidTask {bid_task_id} has started in the background."}), 202
 
+@app.route("/evaluation-jobs/<job_id>", methods=["GET"])
+def get_evaluation_job(job_id):
+    try:
+        job = get_job_manager().get_job(job_id)
+        if not job:
+            return jsonify({"success": False, "message": "Evaluation job not found"}), 404
+        return jsonify({"success": True, "data": job.to_dict()}), 200
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+
 def run_app():
+    if os.getenv("BID_EVALUATION_SCHEDULER", "1") != "0":
+        get_scheduler().start()
     app.run(host='0.0.0.0', port=5000)
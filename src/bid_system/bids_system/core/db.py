@@ -1,29 +1,131 @@
-import os
+import time
 import logging
-from typing import Optional, List, Dict
-from pymongo import MongoClient
-from pymongo.errors import PyMongoError
+import threading
+from typing import Optional, List, Dict, Iterator, Tuple
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError, DuplicateKeyError
 from dataclasses import asdict
-from .schema import BidTasksDB, Bid, BidTaskResults
+from .schema import BidTasksDB, Bid, BidTaskResults, EvaluationJob
+from .mongo import get_mongo_client
+from .pagination import KeysetQuery
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BID_TASK_INDEXES = [
+    IndexModel([("bid_task_id", ASCENDING)],
+               unique=True, name="bid_task_id_unique"),
+    IndexModel([("bid_task_expiry_time", ASCENDING), ("bid_task_id", ASCENDING)],
+               name="bid_task_expiry_time"),
+]
+
+BID_INDEXES = [
+    # bids stored before bid ids were generated all have bid_id "", they are left out
+    IndexModel([("bid_id", ASCENDING)], unique=True, name="bid_id_unique",
+               partialFilterExpression={"bid_id": {"$gt": ""}}),
+    # one bid per subject and task; also serves every lookup by bid_task_id
+    IndexModel([("bid_task_id", ASCENDING), ("bid_subject_id", ASCENDING)],
+               unique=True, name="bid_task_subject_unique"),
+    # the sort indexes end with _id, legacy bids share bid_id "" and need it to break ties
+    IndexModel([("bid_id", ASCENDING), ("_id", ASCENDING)], name="bid_id"),
+    IndexModel([("bid_task_id", ASCENDING), ("bid_id", ASCENDING), ("_id", ASCENDING)],
+               name="bid_task_bid_id"),
+    IndexModel([("bid_task_id", ASCENDING), ("creation_time", ASCENDING), ("bid_id", ASCENDING), ("_id", ASCENDING)],
+               name="bid_task_creation_time"),
+    IndexModel([("creation_time", ASCENDING), ("bid_id", ASCENDING), ("_id", ASCENDING)],
+               name="creation_time"),
+]
+
+RESULT_INDEXES = [
+    IndexModel([("result_id", ASCENDING)],
+               unique=True, name="result_id_unique"),
+    IndexModel([("bid_task_id", ASCENDING), ("created_at", ASCENDING), ("result_id", ASCENDING)],
+               name="bid_task_created_at"),
+    IndexModel([("created_at", ASCENDING), ("result_id", ASCENDING)],
+               name="created_at"),
+]
+
+EVALUATION_JOB_INDEXES = [
+    IndexModel([("job_id", ASCENDING)], unique=True, name="job_id_unique"),
+    IndexModel([("bid_task_id", ASCENDING), ("created_at", DESCENDING)],
+               name="bid_task_created_at"),
+    IndexModel([("status", ASCENDING), ("heartbeat_at", ASCENDING)],
+               name="status_heartbeat_at"),
+]
+
+INDEX_RETRY_BACKOFF = 30.0
+INDEX_MAX_RETRY_BACKOFF = 3600.0
+
+# (collection, index name) of the indexes built by this process
+_indexed = set()
+# (collection, index name) -> (consecutive failures, monotonic time of the next attempt)
+_index_retries = {}
+_indexed_lock = threading.Lock()
+
+
+def ensure_indexes(collection, indexes: List[IndexModel]) -> bool:
+    # registries are created per request, so each index is only built once per process;
+    # they are built one by one, so an index the existing data violates does not hold
+    # back the others, and a failed one is only retried after a backoff
+    ready = True
+    with _indexed_lock:
+        for index in indexes:
+            name = index.document["name"]
+            key = (collection.full_name, name)
+            if key in _indexed:
+                continue
+            failures, retry_at = _index_retries.get(key, (0, 0.0))
+            if time.monotonic() < retry_at:
+                ready = False
+                continue
+            try:
+                collection.create_indexes([index])
+            except PyMongoError as e:
+                delay = min(INDEX_MAX_RETRY_BACKOFF,
+                            INDEX_RETRY_BACKOFF * 2 ** failures)
+                _index_retries[key] = (failures + 1, time.monotonic() + delay)
+                logger.error(
+                    f"Failed to create index {name} on {collection.full_name}, retrying in {delay:.0f}s: {e}")
+                ready = False
+                continue
+            _indexed.add(key)
+            _index_retries.pop(key, None)
+            logger.info(f"Index {name} ensured on {collection.full_name}.")
+    return ready
+
+
+def index_ready(collection, name: str) -> bool:
+    return (collection.full_name, name) in _indexed
+
 
 class BidTaskRegistryDB:
+    # the last field of every sort is unique, so keyset pages never skip or repeat a document
+    SORT_FIELDS = {
+        "bid_task_id": ["bid_task_id"],
+        "bid_task_expiry_time": ["bid_task_expiry_time", "bid_task_id"],
+    }
+
     def __init__(self):
         try:
-            db_url = os.getenv("DB_URL")
-            if not db_url:
-                raise ValueError("DB_URL environment variable is not set.")
-            self.client = MongoClient(db_url)
-            self.db = self.client["BidTaskDB"]
-            self.collection = self.db["BidTasks"]
+            ensure_indexes(self.collection, BID_TASK_INDEXES)
             logger.info("Connected to MongoDB.")
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
 
+    @property
+    def client(self):
+        # resolved per call so registries created before a fork use the child's client
+        return get_mongo_client()
+
+    @property
+    def db(self):
+        return self.client["BidTaskDB"]
+
+    @property
+    def collection(self):
+        return self.db["BidTasks"]
+
     def create_bid_task(self, bid_task: BidTasksDB) -> bool:
         try:
             self.collection.insert_one(asdict(bid_task))
@@ -93,26 +195,185 @@ class BidTaskRegistryDB:
             logger.error(f"Error querying bid tasks: {e}")
             return []
 
+    @staticmethod
+    def _claimable(claimed_before: float, max_attempts: int) -> Dict:
+        # never completed, out of any retry backoff, and unclaimed or claimed by an owner
+        # that stopped renewing the claim
+        query = {"evaluation_completed_at": None,
+                 "evaluation_next_attempt_at": {"$not": {"$gt": time.time()}},
+                 "$or": [{"evaluation_claimed_by": None},
+                         {"evaluation_claimed_at": {"$lt": claimed_before}}]}
+        if max_attempts:
+            query["evaluation_attempts"] = {"$not": {"$gte": max_attempts}}
+        return query
+
+    def list_unclaimed_expiries(self, start: int, end: int, limit: int = 10000,
+                                claimed_before: float = 0.0, max_attempts: int = 0) -> List[Dict]:
+        # served by the (bid_task_expiry_time, bid_task_id) index
+        try:
+            return list(self.collection.find(
+                {"bid_task_expiry_time": {"$gte": start, "$lte": end},
+                 **self._claimable(claimed_before, max_attempts)},
+                {"_id": 0, "bid_task_id": 1, "bid_task_expiry_time": 1},
+                sort=[("bid_task_expiry_time", ASCENDING)], limit=limit))
+        except PyMongoError as e:
+            logger.error(f"Error listing bid task expiries: {e}")
+            return []
+
+    def claim_evaluation(self, bid_task_id: str, owner: str, claimed_before: float = 0.0,
+                         max_attempts: int = 0) -> bool:
+        # a single conditional update, so only one replica wins the claim
+        try:
+            result = self.collection.update_one(
+                {"bid_task_id": bid_task_id, **self._claimable(claimed_before, max_attempts)},
+                {"$set": {"evaluation_claimed_by": owner, "evaluation_claimed_at": time.time()},
+                 "$inc": {"evaluation_attempts": 1}})
+            return result.modified_count > 0
+        except PyMongoError as e:
+            logger.error(f"Error claiming evaluation of bid task {bid_task_id}: {e}")
+            return False
+
+    def renew_evaluation_claims(self, bid_task_ids: List[str], owner: str) -> bool:
+        try:
+            self.collection.update_many(
+                {"bid_task_id": {"$in": bid_task_ids}, "evaluation_claimed_by": owner},
+                {"$set": {"evaluation_claimed_at": time.time()}})
+            return True
+        except PyMongoError as e:
+            logger.error(f"Error renewing evaluation claims: {e}")
+            return False
+
+    def mark_evaluations_completed(self, bid_task_ids: List[str]) -> bool:
+        try:
+            self.collection.update_many(
+                {"bid_task_id": {"$in": bid_task_ids}, "evaluation_completed_at": None},
+                {"$set": {"evaluation_completed_at": time.time()}})
+            return True
+        except PyMongoError as e:
+            logger.error(f"Error marking bid task evaluations completed: {e}")
+            return False
+
+    def complete_evaluation(self, bid_task_id: str, owner: str) -> bool:
+        try:
+            result = self.collection.update_one(
+                {"bid_task_id": bid_task_id, "evaluation_claimed_by": owner},
+                {"$set": {"evaluation_completed_at": time.time()}})
+            return result.modified_count > 0
+        except PyMongoError as e:
+            logger.error(f"Error completing evaluation of bid task {bid_task_id}: {e}")
+            return False
+
+    def release_evaluation(self, bid_task_id: str, owner: str, retry_backoff: float = 0.0,
+                           max_retry_backoff: float = 3600.0) -> bool:
+        # with a backoff, the task can only be claimed again after it, doubling with every attempt
+        query = {"bid_task_id": bid_task_id, "evaluation_claimed_by": owner}
+        try:
+            update = {"$unset": {"evaluation_claimed_by": "", "evaluation_claimed_at": ""}}
+            if retry_backoff:
+                claimed = self.collection.find_one(query, {"_id": 0, "evaluation_attempts": 1})
+                if claimed is None:
+                    return False
+                attempts = max(1, claimed.get("evaluation_attempts", 1))
+                update["$set"] = {"evaluation_next_attempt_at": time.time() + min(
+                    max_retry_backoff, retry_backoff * 2 ** (attempts - 1))}
+            result = self.collection.update_one(query, update)
+            return result.modified_count > 0
+        except PyMongoError as e:
+            logger.error(f"Error releasing evaluation of bid task {bid_task_id}: {e}")
+            return False
+
+    def page_bid_tasks(self, query: Optional[Dict] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                       fields: Optional[List[str]] = None, sort: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        return KeysetQuery(self.SORT_FIELDS, query, sort, cursor, fields).page(self.collection, limit)
+
+    def stream_bid_tasks(self, query: Optional[Dict] = None, cursor: Optional[str] = None, fields: Optional[List[str]] = None,
+                         sort: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+        # arguments are validated here, the documents are read as the iterator is consumed
+        return KeysetQuery(self.SORT_FIELDS, query, sort, cursor, fields).stream(self.collection, limit)
+
+
+class BidStream:
+    """
+    The bids of one task, read from a projected cursor in chunks. Every
+    iteration opens a new cursor, so several evaluation modules can walk the
+    bids while at most one chunk per reader is held in memory.
+    """
+
+    FIELDS = {"_id": 0, "bid_id": 1, "bid_task_id": 1,
+              "creation_time": 1, "bid_data": 1, "bid_subject_id": 1}
+
+    def __init__(self, registry: "BidRegistryDB", bid_task_id: str, chunk_size: int = 1000):
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be a positive integer.")
+        self.registry = registry
+        self.bid_task_id = bid_task_id
+        self.chunk_size = chunk_size
+
+    def chunks(self) -> Iterator[List[Dict]]:
+        # bid_id order comes from the (bid_task_id, bid_id) index, so no in-memory sort
+        cursor = self.registry.collection.find(
+            {"bid_task_id": self.bid_task_id}, self.FIELDS,
+            sort=[("bid_id", ASCENDING)]).batch_size(self.chunk_size)
+        try:
+            chunk = []
+            for bid in cursor:
+                chunk.append(bid)
+                if len(chunk) == self.chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        finally:
+            cursor.close()
+
+    def __iter__(self) -> Iterator[Dict]:
+        for chunk in self.chunks():
+            yield from chunk
+
+    def exists(self) -> bool:
+        return self.registry.collection.find_one(
+            {"bid_task_id": self.bid_task_id}, {"_id": 1}) is not None
+
+    def count(self) -> int:
+        return self.registry.count_bids(self.bid_task_id)
+
 
 class BidRegistryDB:
+    SORT_FIELDS = {
+        "bid_id": ["bid_id", "_id"],
+        "creation_time": ["creation_time", "bid_id", "_id"],
+    }
+
     def __init__(self):
         try:
-            db_url = os.getenv("DB_URL")
-            if not db_url:
-                raise ValueError("DB_URL environment variable is not set.")
-            self.client = MongoClient(db_url)
-            self.db = self.client["BidDB"]
-            self.collection = self.db["Bids"]
+            ensure_indexes(self.collection, BID_INDEXES)
             logger.info("Connected to MongoDB.")
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
 
+    @property
+    def client(self):
+        return get_mongo_client()
+
+    @property
+    def db(self):
+        return self.client["BidDB"]
+
+    @property
+    def collection(self):
+        return self.db["Bids"]
+
     def create_bid(self, bid: Bid) -> bool:
         try:
             self.collection.insert_one(asdict(bid))
             logger.info(f"Bid created with ID: {bid.bid_id}")
             return True
+        except DuplicateKeyError:
+            # raised to the caller, the unique index is what rejects a second bid
+            logger.info(
+                f"Subject {bid.bid_subject_id} already has a bid for task {bid.bid_task_id}")
+            raise
         except PyMongoError as e:
             logger.error(f"Error creating bid: {e}")
             return False
@@ -176,12 +437,74 @@ class BidRegistryDB:
             logger.error(f"Error querying bids: {e}")
             return []
 
+    def count_bids(self, bid_task_id: str) -> int:
+        try:
+            return self.collection.count_documents({"bid_task_id": bid_task_id})
+        except PyMongoError as e:
+            logger.error(f"Error counting bids: {e}")
+            return 0
+
+    def enforces_one_bid_per_subject(self) -> bool:
+        return index_ready(self.collection, "bid_task_subject_unique")
+
+    def has_subject_bid(self, bid_task_id: str, bid_subject_id: str) -> bool:
+        try:
+            return self.collection.find_one(
+                {"bid_task_id": bid_task_id, "bid_subject_id": bid_subject_id}, {"_id": 1}) is not None
+        except PyMongoError as e:
+            logger.error(f"Error looking up bid of subject {bid_subject_id}: {e}")
+            return False
+
+    def count_bid_subjects(self, bid_task_id: str) -> int:
+        if self.enforces_one_bid_per_subject():
+            return self.count_bids(bid_task_id)
+        # without the unique index a subject may hold several bids, so count distinct subjects
+        try:
+            counted = list(self.collection.aggregate([
+                {"$match": {"bid_task_id": bid_task_id}},
+                {"$group": {"_id": "$bid_subject_id"}},
+                {"$count": "subjects"}
+            ]))
+            return counted[0]["subjects"] if counted else 0
+        except PyMongoError as e:
+            logger.error(f"Error counting bid subjects: {e}")
+            return 0
+
+    def stream_task_bids(self, bid_task_id: str, chunk_size: int = 1000) -> BidStream:
+        return BidStream(self, bid_task_id, chunk_size)
+
+    def page_bids(self, query: Optional[Dict] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                  fields: Optional[List[str]] = None, sort: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        return KeysetQuery(self.SORT_FIELDS, query, sort, cursor, fields).page(self.collection, limit)
+
+    def stream_bids(self, query: Optional[Dict] = None, cursor: Optional[str] = None, fields: Optional[List[str]] = None,
+                    sort: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+        return KeysetQuery(self.SORT_FIELDS, query, sort, cursor, fields).stream(self.collection, limit)
+
 
 class BidTaskResultsRegistry:
+    SORT_FIELDS = {
+        "result_id": ["result_id"],
+        "created_at": ["created_at", "result_id"],
+    }
+
     def __init__(self):
-        db_url = os.getenv("DB_URL")
-        client = MongoClient(db_url)
-        self.collection = client["bidding_db"]["bid_task_results"]
+        ensure_indexes(self.collection, RESULT_INDEXES)
+
+    @property
+    def collection(self):
+        return get_mongo_client()["bidding_db"]["bid_task_results"]
+
+    def latest_result_times(self, bid_task_ids: List[str]) -> Dict[str, int]:
+        # served by the (bid_task_id, created_at, result_id) index
+        try:
+            return {group["_id"]: group["created_at"] for group in self.collection.aggregate([
+                {"$match": {"bid_task_id": {"$in": bid_task_ids}}},
+                {"$group": {"_id": "$bid_task_id", "created_at": {"$max": "$created_at"}}}
+            ])}
+        except PyMongoError as e:
+            logger.error(f"Error reading latest results of bid tasks: {e}")
+            raise
 
     def create_result(self, result: BidTaskResults) -> bool:
         try:
@@ -236,3 +559,82 @@ class BidTaskResultsRegistry:
         except Exception as e:
             logging.error(f"Error querying results: {e}")
             raise
+
+    def page_results(self, query: Optional[Dict] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                     fields: Optional[List[str]] = None, sort: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        return KeysetQuery(self.SORT_FIELDS, query, sort, cursor, fields).page(self.collection, limit)
+
+    def stream_results(self, query: Optional[Dict] = None, cursor: Optional[str] = None, fields: Optional[List[str]] = None,
+                       sort: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+        return KeysetQuery(self.SORT_FIELDS, query, sort, cursor, fields).stream(self.collection, limit)
+
+
+class EvaluationJobRegistry:
+    def __init__(self):
+        ensure_indexes(self.collection, EVALUATION_JOB_INDEXES)
+
+    @property
+    def collection(self):
+        return get_mongo_client()["bidding_db"]["evaluation_jobs"]
+
+    def create_job(self, job: EvaluationJob) -> bool:
+        try:
+            self.collection.insert_one(job.to_dict())
+            logging.info(f"Evaluation job created: {job.job_id}")
+            return True
+        except Exception as e:
+            logging.error(f"Error creating evaluation job: {e}")
+            return False
+
+    def update_job(self, job_id: str, update_data: Dict) -> bool:
+        try:
+            result = self.collection.update_one(
+                {"job_id": job_id}, {"$set": update_data})
+            return result.matched_count > 0
+        except Exception as e:
+            logging.error(f"Error updating evaluation job {job_id}: {e}")
+            return False
+
+    def heartbeat_jobs(self, job_ids: List[str], at: float) -> bool:
+        try:
+            self.collection.update_many(
+                {"job_id": {"$in": job_ids}}, {"$set": {"heartbeat_at": at}})
+            return True
+        except Exception as e:
+            logging.error(f"Error recording evaluation job heartbeats: {e}")
+            return False
+
+    def update_jobs(self, query: Dict, update_data: Dict) -> List[EvaluationJob]:
+        # returns the jobs as they were before the update
+        try:
+            jobs = [EvaluationJob.from_dict(job)
+                    for job in self.collection.find(query, {"_id": 0})]
+            if jobs:
+                self.collection.update_many(
+                    {"$and": [query, {"job_id": {"$in": [job.job_id for job in jobs]}}]},
+                    {"$set": update_data})
+            return jobs
+        except Exception as e:
+            logging.error(f"Error updating evaluation jobs: {e}")
+            return []
+
+    def get_job(self, job_id: str) -> Optional[EvaluationJob]:
+        try:
+            job_data = self.collection.find_one({"job_id": job_id})
+            if not job_data:
+                return None
+            return EvaluationJob.from_dict(job_data)
+        except Exception as e:
+            logging.error(f"Error fetching evaluation job: {e}")
+            raise
+
+    def get_latest_job(self, bid_task_id: str) -> Optional[EvaluationJob]:
+        try:
+            job_data = self.collection.find_one(
+                {"bid_task_id": bid_task_id}, sort=[("created_at", DESCENDING)])
+            if not job_data:
+                return None
+            return EvaluationJob.from_dict(job_data)
+        except Exception as e:
+            logging.error(f"Error fetching evaluation job for task {bid_task_id}: {e}")
+            raise
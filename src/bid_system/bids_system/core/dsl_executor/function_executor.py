@@ -10,15 +10,74 @@ import sys
 import logging
 from pathlib import Path
 import hashlib
+import json
+import time
 import shutil
+import threading
 
 
 logging.basicConfig(level=logging.INFO)
 
+# code from the cache is imported and run, so it lives in a per-user private directory
+ARTIFACT_CACHE_DIR = Path(os.getenv("DSL_ARTIFACT_CACHE_DIR") or Path(
+    os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "dsl_artifact_cache")
+# cached archives are revalidated with the server (ETag / Last-Modified) once this old
+ARTIFACT_CACHE_TTL = float(os.getenv("DSL_ARTIFACT_CACHE_TTL", "300"))
+ARTIFACT_CACHE_MAX_BYTES = int(
+    os.getenv("DSL_ARTIFACT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+_install_lock = threading.Lock()
+_installed_requirements = set()
+
+
+def _private_dir(path: Path) -> Path:
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    stat = os.lstat(path)
+    if not os.path.isdir(path) or os.path.islink(path) \
+            or (hasattr(os, "getuid") and stat.st_uid != os.getuid()) or stat.st_mode & 0o077:
+        raise PermissionError(
+            f"Artifact cache directory {path} must be a directory private to the current user")
+    return path
+
+
+def _cache_dir(name: str) -> Path:
+    _private_dir(ARTIFACT_CACHE_DIR)
+    return _private_dir(ARTIFACT_CACHE_DIR / name)
+
+
+def _evict_artifacts(keep: Path):
+    # least recently used archives go first until the cache fits its budget
+    archives_dir = ARTIFACT_CACHE_DIR / "archives"
+    entries = []
+    for path in archives_dir.glob("*.archive"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= ARTIFACT_CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        for stale in (path, path.with_suffix(".json")):
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+        total -= size
+        logging.info(f"Evicted cached artifact {path.name}")
+
 
 class LocalCodeExecutor:
-    def __init__(self, download_url: str, global_settings: dict, global_parameters: dict, settings: dict, parameters: dict, global_state: dict):
+    def __init__(self, download_url: str, global_settings: dict, global_parameters: dict, settings: dict, parameters: dict, global_state: dict,
+                 code_version: str = "", use_cache: bool = True):
         self.download_url = download_url
+        # a version published with the workflow makes new content a new cache entry
+        self.code_version = code_version
+        # without the cache a cached archive is always revalidated before use
+        self.use_cache = use_cache
         self.session_uuid = str(uuid.uuid4())
         self.temp_dir = Path(f"/tmp/{self.session_uuid}")
         self.code_dir = self.temp_dir / "code"
@@ -29,8 +88,9 @@ class LocalCodeExecutor:
         self.parameters = parameters
         self.global_settings = global_settings
         self.global_parameters = global_parameters
-        self.cache = {}
         self.global_state = global_state
+        self.prepared = False
+        self._prepare_lock = threading.Lock()
 
     def download(self):
         # Check if the path is a local file or directory
@@ -52,25 +112,58 @@ class LocalCodeExecutor:
                 raise ValueError(
                     "Unsupported local path format or non-existing path")
 
-        # Handle remote downloads
-        url_hash = hashlib.md5(self.download_url.encode()).hexdigest()
-        if url_hash in self.cache:
-            logging.info("Loading from cache")
-            cached_path = Path(self.cache.get(url_hash))
-            if cached_path.exists():
-                return cached_path
+        # Handle remote downloads, shared across executors through the artifact cache
+        url_hash = hashlib.md5(
+            f"{self.download_url}\0{self.code_version}".encode()).hexdigest()
+        archive_path = _cache_dir("archives") / f"{url_hash}.archive"
+        meta_path = archive_path.with_suffix(".json")
+        meta = {}
+        if archive_path.exists():
+            try:
+                meta = json.loads(meta_path.read_text())
+            except (OSError, ValueError):
+                meta = {}
+            if self.use_cache and time.time() - meta.get("validated_at", 0) < ARTIFACT_CACHE_TTL:
+                logging.info("Loading from cache")
+                os.utime(archive_path)
+                return archive_path
 
+        headers = {}
+        if archive_path.exists():
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        partial_path = archive_path.with_suffix(f".{self.session_uuid}")
         try:
-            response = requests.get(self.download_url, stream=True)
-            response.raise_for_status()
-            archive_path = self.temp_dir / "archive"
-            with open(archive_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            self.cache[url_hash] = str(archive_path)
-            logging.info(f"Downloaded and cached file to {archive_path}")
+            response = requests.get(
+                self.download_url, stream=True, headers=headers)
+            if response.status_code == 304:
+                logging.info("Cached artifact is still current")
+            else:
+                response.raise_for_status()
+                with open(partial_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        f.write(chunk)
+                os.replace(partial_path, archive_path)
+                meta = {"etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified")}
+                logging.info(f"Downloaded and cached file to {archive_path}")
+            meta["validated_at"] = time.time()
+            partial_meta = meta_path.with_suffix(f".{self.session_uuid}.json")
+            partial_meta.write_text(json.dumps(meta))
+            os.replace(partial_meta, meta_path)
+            os.utime(archive_path)
+            _evict_artifacts(keep=archive_path)
             return archive_path
         except requests.exceptions.RequestException as e:
+            if partial_path.exists():
+                partial_path.unlink()
+            if archive_path.exists() and self.use_cache:
+                logging.warning(
+                    f"Could not revalidate {self.download_url}, using cached artifact: {e}")
+                return archive_path
             logging.error(f"Error downloading file: {e}")
             raise
 
@@ -101,12 +194,25 @@ class LocalCodeExecutor:
 
     def install_dependencies(self):
         try:
-            if self.requirements_file.exists():
+            if not self.requirements_file.exists():
+                logging.warning("No requirements.txt found")
+                return
+
+            requirements_hash = hashlib.sha256(
+                sys.executable.encode() + self.requirements_file.read_bytes()).hexdigest()
+            marker = _cache_dir("installed") / requirements_hash
+
+            with _install_lock:
+                if requirements_hash in _installed_requirements or marker.exists():
+                    _installed_requirements.add(requirements_hash)
+                    logging.info("Dependencies from requirements.txt already installed")
+                    return
+
                 subprocess.check_call(
                     [sys.executable, "-m", "pip", "install", "-r", str(self.requirements_file)])
+                marker.touch()
+                _installed_requirements.add(requirements_hash)
                 logging.info("Installed dependencies from requirements.txt")
-            else:
-                logging.warning("No requirements.txt found")
         except subprocess.CalledProcessError as e:
             logging.error(f"Error installing dependencies: {e}")
             raise
@@ -141,13 +247,35 @@ class LocalCodeExecutor:
             logging.error(f"Error during evaluation: {e}")
             raise
 
-    def execute(self, input_data):
-        try:
+    def prepare(self):
+        if self.prepared:
+            return
+        with self._prepare_lock:
+            if self.prepared:
+                return
             archive_path = self.download()
             self.unpack(archive_path)
             self.install_dependencies()
             self.initialize_function()
+            self.prepared = True
+
+    def execute(self, input_data):
+        try:
+            self.prepare()
             return self.evaluate(input_data)
         except Exception as e:
             logging.error(f"Execution failed: {e}")
             raise
+
+    def cleanup(self):
+        try:
+            if self.temp_dir.exists():
+                shutil.rmtree(self.temp_dir)
+                logging.info(
+                    f"Cleaned up temporary directory: {self.temp_dir}")
+            else:
+                logging.warning(
+                    "Temporary directory does not exist, nothing to clean up")
+        except Exception as e:
+            logging.error(f"Error during cleanup: {e}")
+            raise
@@ -1,4 +1,7 @@
+import os
+import time
 import logging
+import threading
 from collections import defaultdict, deque
 from typing import Dict, Any
 
@@ -7,10 +10,16 @@ from .db_client import WorkflowsClient
 
 logging.basicConfig(level=logging.INFO)
 
+WORKFLOW_CACHE_TTL = float(os.getenv("DSL_WORKFLOW_CACHE_TTL", "60"))
+
+_workflow_cache = {}
+_workflow_cache_lock = threading.Lock()
+
 
 class DSLWorkflowExecutor:
-    def __init__(self, dsl: Dict[str, Any]):
+    def __init__(self, dsl: Dict[str, Any], use_cache: bool = True):
         self.dsl = dsl
+        self.use_cache = use_cache
         self.global_settings = dsl.get("globalSettings", {})
         self.global_parameters = dsl.get("globalParameters", {})
         self.modules = dsl.get("modules", {})
@@ -33,10 +42,10 @@ class DSLWorkflowExecutor:
         in_degree = defaultdict(int)
 
         for source, targets in self.graph.items():
+            in_degree.setdefault(source, 0)
             for target in targets:
                 adjacency_list[source].append(target)
                 in_degree[target] += 1
-                in_degree.setdefault(source, 0)
 
         # Perform topological sorting to detect cycles
         queue = deque([node for node in in_degree if in_degree[node] == 0])
@@ -67,10 +76,16 @@ class DSLWorkflowExecutor:
                 global_parameters=self.global_parameters,
                 settings=settings,
                 parameters=parameters,
-                global_state={}
+                global_state={},
+                code_version=str(module_info.get("codeVersion", "")),
+                use_cache=self.use_cache
             )
             self.local_code_executors[module_key] = executor
 
+    def prepare(self):
+        for module_key in self.execution_order:
+            self.local_code_executors[module_key].prepare()
+
     def execute(self, input_data: Dict[str, Any]):
         previous_outputs = {}
         sink_nodes = [node for node in self.graph if not self.graph[node]]
@@ -95,19 +110,58 @@ class DSLWorkflowExecutor:
         }
         return final_output
 
+    def clean_up(self):
+        try:
+            for module in self.modules:
+                module_executor: LocalCodeExecutor = self.local_code_executors.get(
+                    module)
+                if module_executor:
+                    module_executor.cleanup()
+
+        except Exception as e:
+            raise e
+
+
+def fetch_workflow(workflow_id: str, workflows_base_uri: str, use_cache: bool = True) -> Dict[str, Any]:
+    key = (workflows_base_uri, workflow_id)
+    if use_cache:
+        with _workflow_cache_lock:
+            cached = _workflow_cache.get(key)
+        if cached and time.monotonic() - cached[0] < WORKFLOW_CACHE_TTL:
+            return cached[1]
 
-def new_dsl_workflow_executor(workflow_id: str, workflows_base_uri: str) -> DSLWorkflowExecutor:
+    workflows_db = WorkflowsClient(workflows_base_uri)
+    dsl_data = workflows_db.get_workflow(workflow_id)
+
+    # failed lookups are returned as {"success": False, ...} and must not be cached
+    if isinstance(dsl_data, dict) and dsl_data.get("success") is not False:
+        with _workflow_cache_lock:
+            _workflow_cache[key] = (time.monotonic(), dsl_data)
+    return dsl_data
+
+
+def new_dsl_workflow_executor(workflow_id: str, workflows_base_uri: str, use_cache: bool = True) -> DSLWorkflowExecutor:
     try:
 
-        workflows_db = WorkflowsClient(workflows_base_uri)
-        dsl_data = workflows_db.get_workflow(workflow_id)
+        dsl_data = fetch_workflow(workflow_id, workflows_base_uri, use_cache)
 
         # initialize
-        return DSLWorkflowExecutor(dsl_data)
+        return DSLWorkflowExecutor(dsl_data, use_cache)
 
     except Exception as e:
         raise e
 
+
+def prefetch_workflow(workflow_id: str, workflows_base_uri: str):
+    # warms the workflow definition, module artifacts and dependency installs
+    dsl = DSLWorkflowExecutor(fetch_workflow(
+        workflow_id, workflows_base_uri, use_cache=False), use_cache=False)
+    try:
+        dsl.prepare()
+    finally:
+        dsl.clean_up()
+
+
 def parse_dsl_output(output: dict, module_name: str = ""):
     if module_name == "":
         return output['output']
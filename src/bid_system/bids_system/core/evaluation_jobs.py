@@ -0,0 +1,180 @@
+import os
+import time
+import socket
+import logging
+import threading
+from queue import Queue, Full
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .db import EvaluationJobRegistry
+from .evaluator import BidsEvaluator
+from .schema import EvaluationJob
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def _run_evaluation(bid_task_id: str):
+    return BidsEvaluator(bid_task_id).evaluate()
+
+
+class EvaluationJobManager:
+    def __init__(self, num_workers: int = 4, max_queue_size: int = 1024,
+                 registry: Optional[EvaluationJobRegistry] = None, evaluate: Callable = _run_evaluation,
+                 heartbeat_interval: float = 15.0, stale_after: float = 120.0):
+        self.num_workers = num_workers
+        self.registry = registry or EvaluationJobRegistry()
+        self.evaluate = evaluate
+        # queued and running jobs are heartbeated, a job whose owner stopped doing so is failed
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue = Queue(maxsize=max_queue_size)
+        # bid_task_id -> queued or running job, a second trigger gets the same job back
+        self._active: Dict[str, EvaluationJob] = {}
+        self._lock = threading.Lock()
+        self._workers = []
+        # called with every job that reaches done or failed
+        self._listeners: List[Callable[[EvaluationJob], None]] = []
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            # whatever an earlier process with this identity left unfinished is not running any more
+            self._fail_abandoned({"owner": self.owner})
+            for index in range(self.num_workers):
+                worker = threading.Thread(
+                    target=self._run, name=f"bid-evaluation-{index}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            threading.Thread(target=self._heartbeat,
+                             name="bid-evaluation-heartbeat", daemon=True).start()
+
+    def add_listener(self, listener: Callable[[EvaluationJob], None]):
+        self._listeners.append(listener)
+
+    def submit(self, bid_task_id: str) -> Tuple[EvaluationJob, bool]:
+        self.start()
+        with self._lock:
+            job = self._active.get(bid_task_id)
+            if job is not None:
+                return job, False
+
+            job = EvaluationJob(bid_task_id=bid_task_id, owner=self.owner,
+                                heartbeat_at=time.time())
+            if not self.registry.create_job(job):
+                raise RuntimeError(
+                    f"Failed to persist evaluation job for BidTask {bid_task_id}.")
+            try:
+                self._queue.put_nowait(job)
+            except Full:
+                self._finish(job, JOB_FAILED, error="Evaluation queue is full.")
+                raise RuntimeError(
+                    "Evaluation queue is full, try again later.")
+            self._active[bid_task_id] = job
+        logger.info(f"Evaluation job {job.job_id} queued for BidTask {bid_task_id}")
+        return job, True
+
+    def get_job(self, job_id: str) -> Optional[EvaluationJob]:
+        with self._lock:
+            for job in self._active.values():
+                if job.job_id == job_id:
+                    return job
+        return self.registry.get_job(job_id)
+
+    def get_task_job(self, bid_task_id: str) -> Optional[EvaluationJob]:
+        with self._lock:
+            job = self._active.get(bid_task_id)
+        return job or self.registry.get_latest_job(bid_task_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            running = sum(1 for job in self._active.values()
+                          if job.status == JOB_RUNNING)
+            return {"workers": len(self._workers), "queued": len(self._active) - running, "running": running}
+
+    def _finish(self, job: EvaluationJob, status: str, result_id: str = "", error: str = ""):
+        job.status = status
+        job.finished_at = time.time()
+        job.result_id = result_id
+        job.error = error
+        self.registry.update_job(job.job_id, {
+            "status": status, "finished_at": job.finished_at, "result_id": result_id, "error": error})
+        for listener in self._listeners:
+            try:
+                listener(job)
+            except Exception as e:
+                logger.error(
+                    f"Evaluation job listener failed for job {job.job_id}: {e}")
+
+    def _fail_abandoned(self, query: Dict):
+        with_status = {"$and": [query, {"status": {"$in": [JOB_QUEUED, JOB_RUNNING]}}]}
+        jobs = self.registry.update_jobs(with_status, {
+            "status": JOB_FAILED, "finished_at": time.time(),
+            "error": "Evaluation job was abandoned by its worker process."})
+        for job in jobs:
+            logger.warning(
+                f"Evaluation job {job.job_id} for BidTask {job.bid_task_id} was abandoned by {job.owner}")
+        return jobs
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                with self._lock:
+                    job_ids = [job.job_id for job in self._active.values()]
+                now = time.time()
+                if job_ids:
+                    self.registry.heartbeat_jobs(job_ids, now)
+                # jobs of replicas that died without a restart
+                self._fail_abandoned({"heartbeat_at": {"$lt": now - self.stale_after},
+                                      "job_id": {"$nin": job_ids}})
+            except Exception as e:
+                logger.error(f"Evaluation job heartbeat failed: {e}")
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+                self.registry.update_job(
+                    job.job_id, {"status": JOB_RUNNING, "started_at": job.started_at})
+                try:
+                    result = self.evaluate(job.bid_task_id)
+                    self._finish(job, JOB_DONE, result_id=getattr(
+                        result, "result_id", ""))
+                    logger.info(
+                        f"Evaluation job {job.job_id} for BidTask {job.bid_task_id} "
+                        f"finished in {job.finished_at - job.started_at:.2f}s")
+                except Exception as e:
+                    self._finish(job, JOB_FAILED, error=str(e))
+                    logger.error(
+                        f"Evaluation job {job.job_id} for BidTask {job.bid_task_id} failed: {e}")
+            finally:
+                with self._lock:
+                    if self._active.get(job.bid_task_id) is job:
+                        del self._active[job.bid_task_id]
+                self._queue.task_done()
+
+
+_job_manager: Optional[EvaluationJobManager] = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> EvaluationJobManager:
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = EvaluationJobManager(
+                num_workers=int(os.getenv("BID_EVALUATION_WORKERS", "4")),
+                max_queue_size=int(os.getenv("BID_EVALUATION_QUEUE_SIZE", "1024")),
+                heartbeat_interval=float(os.getenv("BID_EVALUATION_HEARTBEAT_SECONDS", "15")),
+                stale_after=float(os.getenv("BID_EVALUATION_JOB_STALE_SECONDS", "120")),
+            )
+        return _job_manager
@@ -0,0 +1,268 @@
+import os
+import time
+import heapq
+import socket
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .db import BidTaskRegistryDB, BidRegistryDB, BidTaskResultsRegistry
+from .evaluation_jobs import JOB_DONE, EvaluationJobManager, get_job_manager
+from .schema import BidTasksDB, EvaluationJob
+
+logger = logging.getLogger(__name__)
+
+
+class EvaluationScheduler:
+    """
+    Starts the evaluation of a bid task as soon as bidding closes, either when
+    the task expires or when every involved subject has placed a bid.
+
+    Upcoming expiries are kept in a min-heap and the scheduler thread sleeps
+    until the earliest one. Before a task is evaluated it is claimed with a
+    conditional update, so with several replicas only one of them runs it.
+    The claim is renewed while the job runs, kept once it is done and given
+    back when it fails; a claim nobody renews expires and is taken over.
+    """
+
+    def __init__(self, bid_task_db: Optional[BidTaskRegistryDB] = None, bid_db: Optional[BidRegistryDB] = None,
+                 job_manager: Optional[EvaluationJobManager] = None, horizon: float = 3600.0,
+                 catchup: float = 3600.0, refresh_interval: float = 30.0, grace: float = 1.0,
+                 claim_ttl: float = 600.0, max_attempts: int = 3, retry_backoff: float = 60.0,
+                 max_retry_backoff: float = 3600.0, results_db: Optional[BidTaskResultsRegistry] = None):
+        self.bid_task_db = bid_task_db or BidTaskRegistryDB()
+        self.bid_db = bid_db or BidRegistryDB()
+        self.results_db = results_db or BidTaskResultsRegistry()
+        self.job_manager = job_manager
+        # only expiries this far ahead are held in memory, the refresh picks up the rest
+        self.horizon = horizon
+        # tasks that expired this long ago without being claimed, e.g. during a restart, are still evaluated
+        self.catchup = catchup
+        self.refresh_interval = refresh_interval
+        # bids that passed the expiry check just before the close get this long to be written
+        self.grace = grace
+        # claims are renewed every refresh, so this must stay well above refresh_interval
+        self.claim_ttl = claim_ttl
+        # a failed evaluation is retried after a backoff that doubles with every attempt,
+        # and a task whose evaluation failed max_attempts times is left alone
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        # bid tasks this process holds the claim for, until their job finishes
+        self._claimed = set()
+        self._listening = False
+        self._heap: List[Tuple[float, str]] = []
+        self._due: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._next_refresh = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and not self._stopped
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(
+                target=self._run, name="bid-evaluation-scheduler", daemon=True)
+            self._thread.start()
+        logger.info(f"Evaluation scheduler started as {self.owner}")
+
+    def stop(self, timeout: float = 5.0):
+        with self._cond:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+    def due_time(self, expiry_time: int) -> float:
+        # is_expired() flips once the clock passes the expiry second
+        return expiry_time + 1 + self.grace
+
+    def schedule(self, bid_task_id: str, expiry_time: int) -> bool:
+        if not self.running or not isinstance(expiry_time, (int, float)):
+            return False
+        due = self.due_time(expiry_time)
+        if due > time.time() + self.horizon:
+            return False
+        with self._cond:
+            if self._due.get(bid_task_id) == due:
+                return True
+            # a changed expiry leaves the old heap entry behind, it is skipped when popped
+            self._due[bid_task_id] = due
+            heapq.heappush(self._heap, (due, bid_task_id))
+            if self._heap[0][1] == bid_task_id:
+                self._cond.notify()
+        return True
+
+    def check_participation(self, bid_task: BidTasksDB) -> bool:
+        if not self.running or not bid_task.bid_involved_subjects:
+            return False
+        if self.bid_db.count_bid_subjects(bid_task.bid_task_id) < len(set(bid_task.bid_involved_subjects)):
+            return False
+        return self.trigger(bid_task.bid_task_id, "every involved subject has bid") is not None
+
+    def request_evaluation(self, bid_task: BidTasksDB) -> Tuple[Optional[EvaluationJob], bool]:
+        bid_task_id = bid_task.bid_task_id
+        if not bid_task.is_expired():
+            # bidding is still open, so an early run is not claimed and the task is evaluated again at close
+            return self._job_manager().submit(bid_task_id)
+        job = self.trigger(bid_task_id, "requested")
+        if job is not None:
+            return job, True
+        # claimed by another replica or already evaluated, report that evaluation instead
+        return self._job_manager().get_task_job(bid_task_id), False
+
+    def trigger(self, bid_task_id: str, reason: str) -> Optional[EvaluationJob]:
+        if not self.bid_task_db.claim_evaluation(bid_task_id, self.owner, self._claimed_before(), self.max_attempts):
+            return None
+        with self._cond:
+            self._due.pop(bid_task_id, None)
+            self._claimed.add(bid_task_id)
+        try:
+            job, _ = self._job_manager().submit(bid_task_id)
+        except Exception as e:
+            # give the task back so the next refresh retries it
+            self._release(bid_task_id)
+            logger.error(
+                f"Failed to queue evaluation of BidTask {bid_task_id}: {e}")
+            return None
+        logger.info(
+            f"Evaluation of BidTask {bid_task_id} triggered ({reason}), job {job.job_id}")
+        return job
+
+    def _job_manager(self) -> EvaluationJobManager:
+        with self._cond:
+            if self.job_manager is None:
+                self.job_manager = get_job_manager()
+            if not self._listening:
+                self.job_manager.add_listener(self._on_job_finished)
+                self._listening = True
+            return self.job_manager
+
+    def _claimed_before(self) -> float:
+        return time.time() - self.claim_ttl
+
+    def _release(self, bid_task_id: str):
+        with self._cond:
+            self._claimed.discard(bid_task_id)
+        self.bid_task_db.release_evaluation(
+            bid_task_id, self.owner, self.retry_backoff, self.max_retry_backoff)
+
+    def _on_job_finished(self, job: EvaluationJob):
+        with self._cond:
+            if job.bid_task_id not in self._claimed:
+                return
+            self._claimed.discard(job.bid_task_id)
+        if job.status == JOB_DONE:
+            self.bid_task_db.complete_evaluation(job.bid_task_id, self.owner)
+            return
+        # a refresh after the backoff picks the task up again, up to max_attempts
+        self.bid_task_db.release_evaluation(
+            job.bid_task_id, self.owner, self.retry_backoff, self.max_retry_backoff)
+        logger.warning(
+            f"Evaluation of BidTask {job.bid_task_id} failed, released it for a retry: {job.error}")
+
+    def _skip_evaluated(self, expiries: List[Dict], now: float) -> List[Dict]:
+        # tasks that closed before this scheduler ran may have been evaluated another way,
+        # e.g. manually; a result written after the close counts as their evaluation
+        closed = {task["bid_task_id"]: task["bid_task_expiry_time"]
+                  for task in expiries if task["bid_task_expiry_time"] < now}
+        if not closed:
+            return expiries
+        evaluated = [bid_task_id for bid_task_id, created_at in
+                     self.results_db.latest_result_times(list(closed)).items()
+                     if created_at >= closed[bid_task_id]]
+        if not evaluated:
+            return expiries
+        self.bid_task_db.mark_evaluations_completed(evaluated)
+        logger.info(
+            f"Skipping {len(evaluated)} closed bid tasks that already have a result")
+        evaluated = set(evaluated)
+        return [task for task in expiries if task["bid_task_id"] not in evaluated]
+
+    def _refresh(self):
+        with self._cond:
+            claimed = list(self._claimed)
+        if claimed:
+            self.bid_task_db.renew_evaluation_claims(claimed, self.owner)
+
+        now = time.time()
+        expiries = self.bid_task_db.list_unclaimed_expiries(
+            int(now - self.catchup), int(now + self.horizon),
+            claimed_before=self._claimed_before(), max_attempts=self.max_attempts)
+        for task in self._skip_evaluated(expiries, now):
+            self.schedule(task["bid_task_id"], task["bid_task_expiry_time"])
+
+    def _pop_due(self) -> List[str]:
+        now = time.time()
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                at, bid_task_id = heapq.heappop(self._heap)
+                if self._due.get(bid_task_id) == at:
+                    del self._due[bid_task_id]
+                    due.append(bid_task_id)
+        return due
+
+    def _fire(self, bid_task_id: str):
+        # the expiry may have been moved since the task was scheduled
+        bid_task = self.bid_task_db.get_bid_task(bid_task_id)
+        if bid_task is None:
+            return
+        if self.due_time(bid_task.bid_task_expiry_time) > time.time():
+            self.schedule(bid_task_id, bid_task.bid_task_expiry_time)
+            return
+        self.trigger(bid_task_id, "bid task expired")
+
+    def _run(self):
+        while not self._stopped:
+            if time.time() >= self._next_refresh:
+                try:
+                    self._refresh()
+                except Exception as e:
+                    logger.error(f"Failed to load upcoming bid task expiries: {e}")
+                self._next_refresh = time.time() + self.refresh_interval
+
+            for bid_task_id in self._pop_due():
+                try:
+                    self._fire(bid_task_id)
+                except Exception as e:
+                    logger.error(
+                        f"Failed to trigger evaluation of BidTask {bid_task_id}: {e}")
+
+            with self._cond:
+                if self._stopped:
+                    return
+                timeout = self._next_refresh - time.time()
+                if self._heap:
+                    timeout = min(timeout, self._heap[0][0] - time.time())
+                if timeout > 0:
+                    self._cond.wait(timeout)
+
+
+_scheduler: Optional[EvaluationScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> EvaluationScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = EvaluationScheduler(
+                horizon=float(os.getenv("BID_EVALUATION_HORIZON_SECONDS", "3600")),
+                catchup=float(os.getenv("BID_EVALUATION_CATCHUP_SECONDS", "3600")),
+                refresh_interval=float(os.getenv("BID_EVALUATION_REFRESH_SECONDS", "30")),
+                grace=float(os.getenv("BID_EVALUATION_GRACE_SECONDS", "1")),
+                claim_ttl=float(os.getenv("BID_EVALUATION_CLAIM_TTL_SECONDS", "600")),
+                max_attempts=int(os.getenv("BID_EVALUATION_MAX_ATTEMPTS", "3")),
+                retry_backoff=float(os.getenv("BID_EVALUATION_RETRY_BACKOFF_SECONDS", "60")),
+                max_retry_backoff=float(os.getenv("BID_EVALUATION_MAX_RETRY_BACKOFF_SECONDS", "3600")),
+            )
+        return _scheduler
@@ -3,16 +3,19 @@ import asyncio
 import threading
 import logging
 from typing import Dict, List
-from .db import BidTaskResultsRegistry, BidTaskRegistryDB, BidRegistryDB
+from .db import BidTaskResultsRegistry, BidTaskRegistryDB, BidRegistryDB, BidStream
 from .events import EventsPusher
-from .schema import BidTasksDB, BidTaskResults, Bid
+from .schema import BidTasksDB, BidTaskResults, Bid, EVAL_MODE_STREAM, EVAL_MODE_MAP_REDUCE
+from .map_reduce import get_map_reduce_evaluator
 
 from .dsl_executor import new_dsl_workflow_executor, parse_dsl_output
 
 
 class BidsEvaluator:
-    def __init__(self, bid_task_id: str):
+    def __init__(self, bid_task_id: str, chunk_size: int = None):
         self.bid_task_id = bid_task_id
+        self.chunk_size = chunk_size or int(
+            os.getenv("BID_EVALUATION_CHUNK_SIZE", "1000"))
         self.bid_task = None
         self.bids = []
         self.bid_task_db = BidTaskRegistryDB()
@@ -26,8 +29,15 @@ class BidsEvaluator:
             if not bid_task:
                 return {"success": False, "message": f"Bid task with ID '{self.bid_task_id}' does not exist."}
 
-            bids = self.bid_db.query_bids({"bid_task_id": self.bid_task_id})
-            if not bids:
+            if bid_task.bid_task_eval_mode in (EVAL_MODE_STREAM, EVAL_MODE_MAP_REDUCE):
+                bids = self.bid_db.stream_task_bids(
+                    self.bid_task_id, self.chunk_size)
+                has_bids = bids.exists()
+            else:
+                bids = self.bid_db.query_bids(
+                    {"bid_task_id": self.bid_task_id})
+                has_bids = bool(bids)
+            if not has_bids:
                 return {"success": False, "message": "No bids found for the given bid task ID."}
 
             self.bid_task = bid_task
@@ -46,19 +56,31 @@ class BidsEvaluator:
             bid_task: BidTasksDB = self.bid_task
             bids: List[Bid] = self.bids
 
-            # Convert bids to dict for evaluation
-            to_dict_bids = [bid.to_dict() for bid in bids]
+            # Convert bids to dict for evaluation; a stream already yields dicts
+            if isinstance(bids, BidStream):
+                to_dict_bids = bids
+            else:
+                to_dict_bids = [bid.to_dict() for bid in bids]
 
             # Evaluate DSL
-            workflow = new_dsl_workflow_executor(
-                workflow_id=bid_task.bid_task_eval_dsl_id,
-                workflows_base_uri=os.getenv("DSL_DB_URL")
-            )
-            eval_result = workflow.execute({
-                "bid_data": bid_task.to_dict(),
-                "bids": to_dict_bids
-            })
-            eval_output = parse_dsl_output(eval_result)
+            if bid_task.bid_task_eval_mode == EVAL_MODE_MAP_REDUCE:
+                eval_output = get_map_reduce_evaluator().run(
+                    map_workflow_id=bid_task.bid_task_eval_map_dsl_id,
+                    reduce_workflow_id=bid_task.bid_task_eval_reduce_dsl_id,
+                    workflows_base_uri=os.getenv("DSL_DB_URL"),
+                    bid_task_data=bid_task.to_dict(),
+                    chunks=to_dict_bids.chunks()
+                )
+            else:
+                workflow = new_dsl_workflow_executor(
+                    workflow_id=bid_task.bid_task_eval_dsl_id,
+                    workflows_base_uri=os.getenv("DSL_DB_URL")
+                )
+                eval_result = workflow.execute({
+                    "bid_data": bid_task.to_dict(),
+                    "bids": to_dict_bids
+                })
+                eval_output = parse_dsl_output(eval_result)
 
             # Post Evaluation DSL
             if bid_task.bid_task_post_evaluation_id:
@@ -100,6 +122,7 @@ class BidsEvaluator:
             # Push events
             asyncio.run(self._push_events(winner_subjects,
                         bid_task.bid_task_initiator_subject_id, eval_push_data))
+            return result
 
         except Exception as e:
             logging.error(
@@ -0,0 +1,135 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional
+
+from .dsl_executor import new_dsl_workflow_executor, parse_dsl_output
+from .dsl_executor.workflow_executor import WORKFLOW_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# per worker process: (workflow_id, workflows_base_uri) -> (created_at, executor)
+_map_executors = {}
+
+
+def _map_chunk(workflow_id: str, workflows_base_uri: str, bid_task_data: Dict, chunk_index: int, bids: List[Dict]) -> Dict:
+    # runs in a pool process; the prepared workflow is reused across chunks and evaluations
+    key = (workflow_id, workflows_base_uri)
+    cached = _map_executors.get(key)
+    if cached is None or time.monotonic() - cached[0] > WORKFLOW_CACHE_TTL:
+        if cached is not None:
+            cached[1].clean_up()
+        cached = (time.monotonic(), new_dsl_workflow_executor(
+            workflow_id=workflow_id, workflows_base_uri=workflows_base_uri))
+        _map_executors[key] = cached
+
+    output = cached[1].execute({
+        "bid_data": bid_task_data,
+        "bids": bids,
+        "chunk_index": chunk_index
+    })
+    return parse_dsl_output(output)
+
+
+class MapReduceEvaluator:
+    def __init__(self, parallelism: Optional[int] = None, max_in_flight: Optional[int] = None,
+                 start_method: str = "spawn"):
+        self.parallelism = parallelism or os.cpu_count() or 1
+        # chunks handed to the pool but not yet reduced, bounds the memory held by the parent
+        self.max_in_flight = max_in_flight or self.parallelism * 2
+        # spawn keeps the workers clear of the server's threads, locks and Mongo sockets
+        self.start_method = start_method
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.parallelism,
+                    mp_context=multiprocessing.get_context(self.start_method))
+                logger.info(
+                    f"Started map-reduce evaluation pool with {self.parallelism} processes")
+            return self._pool
+
+    def _reset_pool(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def map(self, workflow_id: str, workflows_base_uri: str, bid_task_data: Dict,
+            chunks: Iterable[List[Dict]]) -> List[Dict]:
+        pool = self._get_pool()
+        partials = {}
+        pending = {}
+
+        def collect(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                partials[pending.pop(future)] = future.result()
+
+        try:
+            for chunk_index, chunk in enumerate(chunks):
+                if len(pending) >= self.max_in_flight:
+                    collect(FIRST_COMPLETED)
+                pending[pool.submit(_map_chunk, workflow_id, workflows_base_uri,
+                                    bid_task_data, chunk_index, chunk)] = chunk_index
+            if pending:
+                collect(ALL_COMPLETED)
+        except BrokenProcessPool:
+            # a worker died, e.g. killed for memory; the next evaluation gets a fresh pool
+            self._reset_pool(pool)
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+        # partial results are reduced in chunk order, whatever order they finished in
+        return [partials[index] for index in range(len(partials))]
+
+    def run(self, map_workflow_id: str, reduce_workflow_id: str, workflows_base_uri: str,
+            bid_task_data: Dict, chunks: Iterable[List[Dict]]) -> Dict:
+        start = time.monotonic()
+        partials = self.map(map_workflow_id, workflows_base_uri,
+                            bid_task_data, chunks)
+        mapped = time.monotonic()
+
+        workflow = new_dsl_workflow_executor(
+            workflow_id=reduce_workflow_id,
+            workflows_base_uri=workflows_base_uri
+        )
+        output = parse_dsl_output(workflow.execute({
+            "bid_data": bid_task_data,
+            "partials": partials
+        }))
+        logger.info(
+            f"Map-reduce evaluation of {len(partials)} chunks: map {mapped - start:.2f}s, "
+            f"reduce {time.monotonic() - mapped:.2f}s")
+        return output
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+_map_reduce: Optional[MapReduceEvaluator] = None
+_map_reduce_lock = threading.Lock()
+
+
+def get_map_reduce_evaluator() -> MapReduceEvaluator:
+    global _map_reduce
+    with _map_reduce_lock:
+        if _map_reduce is None:
+            parallelism = os.getenv("BID_EVALUATION_PARALLELISM")
+            _map_reduce = MapReduceEvaluator(
+                parallelism=int(parallelism) if parallelism else None,
+                start_method=os.getenv("BID_EVALUATION_START_METHOD", "spawn"),
+            )
+        return _map_reduce
@@ -0,0 +1,82 @@
+import os
+import logging
+import threading
+from typing import Dict, Optional
+from pymongo import MongoClient
+
+logger = logging.getLogger(__name__)
+
+
+def pool_options_from_env() -> Dict:
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    }
+    for option, env in (("maxIdleTimeMS", "MONGO_MAX_IDLE_TIME_MS"),
+                        ("waitQueueTimeoutMS", "MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+                        ("connectTimeoutMS", "MONGO_CONNECT_TIMEOUT_MS")):
+        value = os.getenv(env)
+        if value:
+            options[option] = int(value)
+    return options
+
+
+class MongoClientRegistry:
+    def __init__(self, pool_options: Optional[Dict] = None):
+        self.pool_options = pool_options
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def get_client(self, db_url: Optional[str] = None) -> MongoClient:
+        db_url = db_url or os.getenv("DB_URL")
+        if not db_url:
+            raise ValueError("DB_URL environment variable is not set.")
+
+        with self._lock:
+            self._check_fork()
+            client = self._clients.get(db_url)
+            if client is None:
+                options = self.pool_options if self.pool_options is not None else pool_options_from_env()
+                # connects lazily, so creating the client does not block on the server
+                client = MongoClient(db_url, **options)
+                self._clients[db_url] = client
+                logger.info(
+                    f"Created MongoDB client with pool options {options}.")
+            return client
+
+    def close_all(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+            if self._pid != os.getpid():
+                return
+        for client in clients:
+            try:
+                client.close()
+            except Exception as e:
+                logger.error(f"Failed to close MongoDB client: {e}")
+
+    def _after_fork(self):
+        # clients and their pools belong to the parent; the child must not touch their sockets
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._clients = {}
+            self._pid = os.getpid()
+
+
+_registry = MongoClientRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: _registry._after_fork())
+
+
+def get_mongo_client(db_url: Optional[str] = None) -> MongoClient:
+    return _registry.get_client(db_url)
+
+
+def close_mongo_clients():
+    _registry.close_all()
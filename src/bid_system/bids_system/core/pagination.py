@@ -0,0 +1,133 @@
+import base64
+import binascii
+from typing import Dict, Iterator, List, Optional, Tuple
+from bson import json_util
+from bson.errors import BSONError
+from pymongo import ASCENDING, DESCENDING
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+
+def encode_cursor(sort_name: str, values: List) -> str:
+    # extended JSON, so an ObjectId tiebreaker survives the round trip
+    data = json_util.dumps([sort_name, values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_name: str, size: int) -> List:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        name, values = json_util.loads(base64.urlsafe_b64decode(padded).decode("utf-8"))
+    except (ValueError, TypeError, BSONError, binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid pagination cursor.")
+    if name != sort_name or not isinstance(values, list) or len(values) != size:
+        raise ValueError("Pagination cursor does not match the requested sort.")
+    return values
+
+
+class KeysetQuery:
+    """
+    A find() walked in the order of an indexed sort key that ends with a unique
+    field, so every page resumes with an index seek past the last document
+    instead of a skip over everything before it.
+    """
+
+    def __init__(self, sort_fields: Dict[str, List[str]], query: Optional[Dict] = None, sort: Optional[str] = None,
+                 cursor: Optional[str] = None, fields: Optional[List[str]] = None):
+        if query is not None and not isinstance(query, dict):
+            raise ValueError("Query must be an object.")
+        self.sort_name = sort or next(iter(sort_fields))
+        descending = self.sort_name.startswith("-")
+        name = self.sort_name.lstrip("-")
+        if name not in sort_fields:
+            raise ValueError(
+                f"Cannot sort on '{name}', supported: {', '.join(sort_fields)}.")
+        direction = DESCENDING if descending else ASCENDING
+        self.keys = [(key, direction) for key in sort_fields[name]]
+
+        self.filter = dict(query or {})
+        if cursor:
+            values = decode_cursor(cursor, self.sort_name, len(self.keys))
+            after = self._after(values, "$lt" if descending else "$gt")
+            self.filter = {"$and": [self.filter, after]} if self.filter else after
+
+        # sort keys are needed to build the next cursor but only returned when asked for
+        self.hidden = []
+        if any(key == "_id" for key, _ in self.keys):
+            self.projection = {}
+            self.hidden.append("_id")
+        else:
+            self.projection = {"_id": 0}
+        if fields:
+            if any(not isinstance(field, str) or not field or field.startswith("$") for field in fields):
+                raise ValueError("Fields must be non-empty field names.")
+            self.projection.update({field: 1 for field in fields})
+            for key, _ in self.keys:
+                if key not in self.projection and key not in self.hidden:
+                    self.projection[key] = 1
+                    self.hidden.append(key)
+
+    def _after(self, values: List, op: str) -> Dict:
+        # (a, b) > (x, y)  <=>  a > x or (a == x and b > y)
+        clauses = []
+        for index, (key, _) in enumerate(self.keys):
+            prefix = {name: {"$eq": values[position]}
+                      for position, (name, _) in enumerate(self.keys[:index])}
+            # a missing field sorts before every value, and $gt/$lt never match it
+            if values[index] is None:
+                if op == "$gt":
+                    clauses.append({**prefix, key: {"$ne": None}})
+                continue
+            clauses.append({**prefix, key: {op: values[index]}})
+            if op == "$lt":
+                clauses.append({**prefix, key: None})
+        if not clauses:
+            # the cursor is already past the last document
+            return {"_id": {"$exists": False}}
+        return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+    def _cursor_for(self, document: Dict) -> str:
+        values = []
+        for key, _ in self.keys:
+            value = document
+            for part in key.split("."):
+                value = value.get(part) if isinstance(value, dict) else None
+            values.append(value)
+        return encode_cursor(self.sort_name, values)
+
+    def _strip(self, document: Dict) -> Dict:
+        for key in self.hidden:
+            document.pop(key, None)
+        return document
+
+    def find(self, collection, limit: Optional[int] = None, batch_size: Optional[int] = None):
+        documents = collection.find(
+            self.filter, self.projection or None, sort=self.keys, limit=limit or 0)
+        if batch_size:
+            documents = documents.batch_size(batch_size)
+        return documents
+
+    def page(self, collection, limit: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+        limit = page_size(limit)
+        # one extra document tells whether another page exists without a count
+        documents = list(self.find(collection, limit + 1))
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = self._cursor_for(documents[-1])
+        return [self._strip(document) for document in documents], next_cursor
+
+    def stream(self, collection, limit: Optional[int] = None, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Dict]:
+        # the server cursor is only opened once the caller starts iterating
+        for document in self.find(collection, limit, batch_size):
+            yield self._strip(document)
+
+
+def page_size(limit: Optional[int]) -> int:
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    if not isinstance(limit, int) or limit < 1:
+        raise ValueError("Limit must be a positive integer.")
+    return min(limit, MAX_PAGE_SIZE)
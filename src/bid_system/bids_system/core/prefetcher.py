@@ -0,0 +1,86 @@
+import os
+import time
+import logging
+import threading
+from queue import Queue, Full
+from typing import Iterable, Optional
+
+from .dsl_executor import prefetch_workflow
+
+logger = logging.getLogger(__name__)
+
+
+class WorkflowPrefetcher:
+    def __init__(self, workflows_base_uri: str, max_queue_size: int = 256, num_workers: int = 2, dedup_ttl: int = 300):
+        self.workflows_base_uri = workflows_base_uri
+        self.num_workers = num_workers
+        self.dedup_ttl = dedup_ttl
+        self._queue = Queue(maxsize=max_queue_size)
+        self._pending = set()
+        self._warmed = {}
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for index in range(self.num_workers):
+                worker = threading.Thread(
+                    target=self._run, name=f"workflow-prefetcher-{index}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, workflow_ids: Iterable[str]) -> int:
+        self.start()
+        enqueued = 0
+        now = time.monotonic()
+        for workflow_id in workflow_ids:
+            if not workflow_id:
+                continue
+            with self._lock:
+                warmed_at = self._warmed.get(workflow_id)
+                if workflow_id in self._pending or (warmed_at and now - warmed_at < self.dedup_ttl):
+                    continue
+                try:
+                    self._queue.put_nowait(workflow_id)
+                except Full:
+                    logger.warning(
+                        f"Prefetch queue is full, skipping workflow {workflow_id}")
+                    continue
+                self._pending.add(workflow_id)
+            enqueued += 1
+        return enqueued
+
+    def _run(self):
+        while True:
+            workflow_id = self._queue.get()
+            try:
+                start = time.monotonic()
+                prefetch_workflow(workflow_id, self.workflows_base_uri)
+                with self._lock:
+                    self._warmed[workflow_id] = time.monotonic()
+                logger.info(
+                    f"Prefetched workflow {workflow_id} in {time.monotonic() - start:.2f}s")
+            except Exception as e:
+                logger.error(f"Failed to prefetch workflow {workflow_id}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(workflow_id)
+                self._queue.task_done()
+
+
+_prefetcher: Optional[WorkflowPrefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> WorkflowPrefetcher:
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = WorkflowPrefetcher(
+                workflows_base_uri=os.getenv("DSL_DB_URL"),
+                max_queue_size=int(os.getenv("DSL_PREFETCH_QUEUE_SIZE", "256")),
+                num_workers=int(os.getenv("DSL_PREFETCH_WORKERS", "2")),
+            )
+        return _prefetcher
@@ -3,6 +3,13 @@ from typing import List, Dict
 import uuid
 import time
 
+# bids are loaded into a list, handed to the evaluation modules as a re-iterable stream,
+# or mapped in chunks across worker processes and reduced into one result
+EVAL_MODE_BATCH = ""
+EVAL_MODE_STREAM = "stream"
+EVAL_MODE_MAP_REDUCE = "map_reduce"
+EVAL_MODES = (EVAL_MODE_BATCH, EVAL_MODE_STREAM, EVAL_MODE_MAP_REDUCE)
+
 
 @dataclass
 class BidTasksDB:
@@ -17,6 +24,9 @@ class BidTasksDB:
         default_factory=lambda: int(time.time()) + 86400)
     bid_task_initiator_subject_id: str = ""
     bid_involved_subjects: List[str] = field(default_factory=list)
+    bid_task_eval_mode: str = EVAL_MODE_BATCH
+    bid_task_eval_map_dsl_id: str = ""
+    bid_task_eval_reduce_dsl_id: str = ""
 
     def is_expired(self) -> bool:
         current_time = int(time.time())
@@ -39,6 +49,9 @@ class BidTasksDB:
             "bid_task_expiry_time": self.bid_task_expiry_time,
             "bid_task_initiator_subject_id": self.bid_task_initiator_subject_id,
             "bid_involved_subjects": self.bid_involved_subjects,
+            "bid_task_eval_mode": self.bid_task_eval_mode,
+            "bid_task_eval_map_dsl_id": self.bid_task_eval_map_dsl_id,
+            "bid_task_eval_reduce_dsl_id": self.bid_task_eval_reduce_dsl_id,
         }
 
     @classmethod
@@ -58,6 +71,10 @@ class BidTasksDB:
             bid_task_initiator_subject_id=data.get(
                 "bid_task_initiator_subject_id", ""),
             bid_involved_subjects=data.get("bid_involved_subjects", []),
+            bid_task_eval_mode=data.get("bid_task_eval_mode", EVAL_MODE_BATCH),
+            bid_task_eval_map_dsl_id=data.get("bid_task_eval_map_dsl_id", ""),
+            bid_task_eval_reduce_dsl_id=data.get(
+                "bid_task_eval_reduce_dsl_id", ""),
         )
 
 
@@ -124,3 +141,46 @@ class BidTaskResults:
             bid_task_type=data.get("bid_task_type", ""),
             created_at=data.get("created_at", int(time.time())),
         )
+
+
+@dataclass
+class EvaluationJob:
+    job_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    bid_task_id: str = ""
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    result_id: str = ""
+    error: str = ""
+    owner: str = ""
+    heartbeat_at: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "bid_task_id": self.bid_task_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result_id": self.result_id,
+            "error": self.error,
+            "owner": self.owner,
+            "heartbeat_at": self.heartbeat_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict):
+        return cls(
+            job_id=data.get("job_id", str(uuid.uuid4())),
+            bid_task_id=data.get("bid_task_id", ""),
+            status=data.get("status", "queued"),
+            created_at=data.get("created_at", time.time()),
+            started_at=data.get("started_at", 0.0),
+            finished_at=data.get("finished_at", 0.0),
+            result_id=data.get("result_id", ""),
+            error=data.get("error", ""),
+            owner=data.get("owner", ""),
+            heartbeat_at=data.get("heartbeat_at", 0.0),
+        )
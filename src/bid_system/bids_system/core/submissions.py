@@ -1,9 +1,13 @@
 import os
 import asyncio
+import logging
 from typing import Dict, Union
-from .schema import BidTasksDB, Bid
+from pymongo.errors import DuplicateKeyError
+from .schema import BidTasksDB, Bid, EVAL_MODE_BATCH, EVAL_MODE_MAP_REDUCE, EVAL_MODES
 from .db import BidTaskRegistryDB, BidRegistryDB
 from .events import EventsPusher
+from .prefetcher import get_prefetcher
+from .evaluation_scheduler import get_scheduler
 
 from .dsl_executor import new_dsl_workflow_executor, parse_dsl_output
 
@@ -25,6 +29,9 @@ def create_bidding_task(bid_task_data: Dict) -> Dict:
         "bid_task_pqt_check_dsl_id": str,
         "bid_task_post_evaluation_id": str,
         "bid_involved_subjects": list,
+        "bid_task_eval_mode": str,
+        "bid_task_eval_map_dsl_id": str,
+        "bid_task_eval_reduce_dsl_id": str,
     }
 
     async def _push_events(events_pusher, bidding_data: BidTasksDB):
@@ -57,6 +64,12 @@ def create_bidding_task(bid_task_data: Dict) -> Dict:
                            f"expected {expected_type.__name__}, got {type(bid_task_data[field]).__name__}",
             }
 
+    if bid_task_data.get("bid_task_eval_mode", EVAL_MODE_BATCH) not in EVAL_MODES:
+        return {"success": False, "message": f"Invalid bid_task_eval_mode, expected one of {list(EVAL_MODES)}"}
+    if bid_task_data.get("bid_task_eval_mode") == EVAL_MODE_MAP_REDUCE and not (
+            bid_task_data.get("bid_task_eval_map_dsl_id") and bid_task_data.get("bid_task_eval_reduce_dsl_id")):
+        return {"success": False, "message": "map_reduce evaluation requires bid_task_eval_map_dsl_id and bid_task_eval_reduce_dsl_id"}
+
     try:
         # Create a BidTasksDB dataclass
         bid_task = BidTasksDB(
@@ -72,11 +85,27 @@ def create_bidding_task(bid_task_data: Dict) -> Dict:
             bid_task_initiator_subject_id=bid_task_data["bid_task_initiator_subject_id"],
             bid_involved_subjects=bid_task_data.get(
                 "bid_involved_subjects", []),
+            bid_task_eval_mode=bid_task_data.get(
+                "bid_task_eval_mode", EVAL_MODE_BATCH),
+            bid_task_eval_map_dsl_id=bid_task_data.get(
+                "bid_task_eval_map_dsl_id", ""),
+            bid_task_eval_reduce_dsl_id=bid_task_data.get(
+                "bid_task_eval_reduce_dsl_id", ""),
         )
 
         # Insert into the database
         db = BidTaskRegistryDB()
         if db.create_bid_task(bid_task):
+            # warm the task's workflows before the first bid or evaluation needs them
+            get_prefetcher().submit([
+                bid_task.bid_task_pqt_check_dsl_id,
+                bid_task.bid_task_eval_dsl_id,
+                bid_task.bid_task_post_evaluation_id,
+                bid_task.bid_task_eval_map_dsl_id,
+                bid_task.bid_task_eval_reduce_dsl_id,
+            ])
+            get_scheduler().schedule(
+                bid_task.bid_task_id, bid_task.bid_task_expiry_time)
             asyncio.run(_push_events(events_pusher, bid_task))
             return {"success": True, "data": bid_task.to_dict()}
 
@@ -143,10 +172,9 @@ def submit_bid(bid_data: Dict) -> Dict:
         if bid_task.is_expired():
             return {"success": False, "message": "Cannot submit bid; the bid task has expired."}
 
-        # Check if the subject_id has already submitted a bid for the given bid_task_id
-        existing_bids = bid_db.query_bids(
-            {"bid_task_id": bid_task_id, "bid_subject_id": bid_subject_id})
-        if existing_bids:
+        # the unique (bid_task_id, bid_subject_id) index rejects a second bid on insert;
+        # until this process has built it, e.g. while legacy duplicates block it, read first
+        if not bid_db.enforces_one_bid_per_subject() and bid_db.has_subject_bid(bid_task_id, bid_subject_id):
             return {"success": False, "message": "Subject has already submitted a bid for this bid task."}
 
         # Check if the bid_subject_id is allowed to participate
@@ -159,14 +187,24 @@ def submit_bid(bid_data: Dict) -> Dict:
 
         # Insert the bid into the database
         bid = Bid(
-            bid_id="",
             bid_task_id=bid_task_id,
             creation_time=int(time.time()),
             bid_data=bid_info,
             bid_subject_id=bid_subject_id,
         )
 
-        if bid_db.create_bid(bid):
+        try:
+            created = bid_db.create_bid(bid)
+        except DuplicateKeyError:
+            return {"success": False, "message": "Subject has already submitted a bid for this bid task."}
+
+        if created:
+            # the last involved subject to bid closes the task without waiting for expiry
+            try:
+                get_scheduler().check_participation(bid_task)
+            except Exception as e:
+                logging.error(
+                    f"Failed to check participation for BidTask {bid_task_id}: {e}")
             return {"success": True, "data": bid.to_dict()}
         else:
             return {"success": False, "message": "Failed to submit bid to the database."}
@@ -0,0 +1,329 @@
+"""
+Offline throughput benchmarks for the constraint managers.
+
+Constraint modules are generated into a local directory and their workflows
+are served from a throwaway HTTP server on 127.0.0.1, so the managers and
+their workers load them exactly as they would in production without network
+access.
+
+Every mode is run over the cross product of payload sizes, numbers of message
+types and client concurrency, and reports throughput, p50/p99 latency and the
+resident memory of the process and its workers:
+
+    python benchmarks/constraints_bench.py --output results.json
+
+Modes:
+
+    sync      ConstraintsManager, one check per call
+    async     AsyncConstraintsManager, one check per call
+    batched   AsyncConstraintsManager.check_batch with --batch-size packets
+    rules     ConstraintsManager with a declarative rule spec and no DSL
+
+Pick a smaller matrix with ``--quick`` or the ``--payload``, ``--types`` and
+``--concurrency`` options.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+SRC_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(SRC_DIR / "constraint_checker_lib"))
+
+CONSTRAINT_TEMPLATE = '''
+class AgentSpaceV1PolicyRule:
+    def __init__(self, rule_id, settings, parameters, global_settings, global_parameters, global_state):
+        self.settings = settings
+        self.parameters = parameters
+
+    def eval(self, parameters, input_data, context):
+        blob = input_data.get("blob", "")
+        allowed = input_data.get("amount", 0) >= 0 and len(blob) < 64 * 1024 * 1024
+        return {"allowed": allowed, "reason_message": "" if allowed else "rejected"}
+'''
+
+RULES = {
+    "type": "object",
+    "required": ["id", "amount", "blob"],
+    "properties": {
+        "id": {"type": "integer", "minimum": 0},
+        "amount": {"type": "number", "minimum": 0},
+        "blob": {"type": "string", "maxLength": 64 * 1024 * 1024},
+    },
+    "expressions": ["amount < 1000000"],
+}
+
+MODES = ["sync", "async", "batched", "rules"]
+
+
+class WorkflowServer:
+    def __init__(self, root: Path):
+        self.root = root
+        self.workflows = {}
+        workflows = self.workflows
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                workflow = workflows.get(self.path.rsplit("/", 1)[-1])
+                body = json.dumps({"data": workflow}).encode()
+                self.send_response(200 if workflow else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def add_constraint(self, workflow_id: str) -> str:
+        path = self.root / "modules" / workflow_id
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "function.py").write_text(CONSTRAINT_TEMPLATE)
+        self.workflows[workflow_id] = {
+            "globalSettings": {},
+            "globalParameters": {},
+            "modules": {"check": {"codePath": str(path), "settings": {}, "parameters": {}}},
+            "graph": {"check": []},
+        }
+        return workflow_id
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def make_packet(index: int, size: int) -> Dict:
+    return {"id": index, "amount": index % 1000, "blob": "x" * size}
+
+
+def rss_mb(pid: int) -> float:
+    # Linux only; other platforms report the parent's peak instead
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid == os.getpid():
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return 0.0
+
+
+def percentile(samples: List[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+
+class ManagerBenchmarks:
+    def __init__(self, server: WorkflowServer, pool_size: int, batch_size: int):
+        self.server = server
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self._workflows = 0
+
+    def _new_manager(self, mode: str, types: int):
+        import constraint_checker
+
+        if mode in ("async", "batched"):
+            manager = constraint_checker.new_async_constraints_manager(
+                self.pool_size)
+        else:
+            manager = constraint_checker.new_constraints_manager()
+
+        message_types = []
+        for index in range(types):
+            message_type = f"bench-{index}"
+            if mode == "rules":
+                manager.load(message_type, "bench", None, RULES)
+            else:
+                self._workflows += 1
+                workflow_id = self.server.add_constraint(
+                    f"constraint-{self._workflows}")
+                manager.load(message_type, "bench", workflow_id)
+            message_types.append(message_type)
+
+        if mode in ("async", "batched"):
+            # wait for every worker to finish loading before the clock starts
+            for message_type in message_types:
+                manager.check_constraint_and_convert_packet(
+                    message_type, make_packet(0, 1), "bench", None).result(60)
+        return manager, message_types
+
+    def _memory(self, manager) -> float:
+        total = rss_mb(os.getpid())
+        if hasattr(manager, "get_pool_stats"):
+            total += sum(rss_mb(worker["pid"])
+                         for worker in manager.get_pool_stats() if worker["alive"])
+        return total
+
+    def _client(self, mode, manager, message_types, packets, latencies, errors):
+        local = []
+        step = self.batch_size if mode == "batched" else 1
+        for turn, offset in enumerate(range(0, len(packets), step)):
+            message_type = message_types[turn % len(message_types)]
+            start = time.perf_counter()
+            try:
+                if mode == "batched":
+                    batch = packets[offset:offset + self.batch_size]
+                    manager.check_batch(message_type, batch).result(120)
+                    # every packet of a batch waits for the whole batch
+                    local.extend([time.perf_counter() - start] * len(batch))
+                    continue
+                if mode == "async":
+                    manager.check_constraint_and_convert_packet(
+                        message_type, packets[offset], "bench", None).result(120)
+                else:
+                    manager.check_constraint_and_convert_packet(
+                        message_type, packets[offset], "bench", None)
+            except Exception as e:
+                errors.append(str(e))
+            local.append(time.perf_counter() - start)
+        latencies.extend(local)
+
+    def run(self, mode: str, payload: int, types: int, concurrency: int, checks: int) -> Dict:
+        manager, message_types = self._new_manager(mode, types)
+        try:
+            per_client = max(1, checks // concurrency)
+            packets = [make_packet(index, payload)
+                       for index in range(per_client)]
+            latencies, errors = [], []
+            clients = [
+                threading.Thread(target=self._client, args=(
+                    mode, manager, message_types, packets, latencies, errors))
+                for _ in range(concurrency)
+            ]
+            start = time.perf_counter()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.perf_counter() - start
+            memory = self._memory(manager)
+        finally:
+            if hasattr(manager, "shutdown"):
+                manager.shutdown()
+            else:
+                for message_type in message_types:
+                    manager.unload(message_type)
+
+        latencies.sort()
+        return {
+            "checks": len(latencies),
+            "errors": len(errors),
+            "seconds": elapsed,
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "rss_mb": memory,
+        }
+
+
+def run_benchmarks(modes: List[str], payloads: List[int], types: List[int], concurrency: List[int],
+                   checks: int, pool_size: int, batch_size: int) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="constraintbench-") as root:
+        # keep artifact and install caches private to this run
+        os.environ["DSL_ARTIFACT_CACHE_DIR"] = os.path.join(root, "cache")
+        server = WorkflowServer(Path(root))
+        os.environ["DSL_DB_URL"] = server.base_url
+        import constraint_checker  # noqa: F401  imported after the environment is set
+        logging.getLogger().setLevel(logging.ERROR)
+
+        benchmarks = ManagerBenchmarks(server, pool_size, batch_size)
+        results = {}
+        try:
+            for mode in modes:
+                for payload in payloads:
+                    # large payloads get fewer checks so every configuration takes similar time
+                    count = max(concurrency[-1], min(checks, (256 * 1024 * 1024) // max(payload, 1)))
+                    for type_count in types:
+                        for clients in concurrency:
+                            name = f"{mode}/payload={payload}/types={type_count}/concurrency={clients}"
+                            print(f"Running benchmark '{name}'...", file=sys.stderr)
+                            results[name] = benchmarks.run(
+                                mode, payload, type_count, clients, count)
+        finally:
+            server.close()
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pool_size": pool_size,
+            "batch_size": batch_size,
+            "checks": checks,
+            "timestamp": int(time.time()),
+        },
+        "results": results,
+    }
+
+
+def print_report(report: Dict):
+    print(f"{'benchmark':<52}{'checks/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'rss MB':>10}{'errors':>8}")
+    for name, stats in report["results"].items():
+        print(f"{name:<52}{stats['throughput']:>12.0f}{stats['p50_ms']:>10.3f}"
+              f"{stats['p99_ms']:>10.3f}{stats['rss_mb']:>10.1f}{stats['errors']:>8}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Constraint manager throughput benchmarks")
+    parser.add_argument("--mode", action="append", choices=MODES,
+                        help="mode to run, may be repeated (default: all)")
+    parser.add_argument("--payload", action="append", type=int,
+                        help="payload size in bytes, may be repeated")
+    parser.add_argument("--types", action="append", type=int,
+                        help="number of message types, may be repeated")
+    parser.add_argument("--concurrency", action="append", type=int,
+                        help="number of client threads, may be repeated")
+    parser.add_argument("--checks", type=int, default=2000,
+                        help="checks per configuration")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="async worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--quick", action="store_true",
+                        help="use a smaller matrix and fewer checks")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        payloads, types, concurrency, checks = [256, 64 * 1024], [1, 4], [1, 8], min(args.checks, 400)
+    else:
+        payloads, types, concurrency, checks = [256, 16 * 1024, 1024 * 1024], [1, 8], [1, 8, 32], args.checks
+
+    report = run_benchmarks(
+        args.mode or MODES,
+        args.payload or payloads,
+        args.types or types,
+        sorted(args.concurrency or concurrency),
+        checks,
+        args.pool_size,
+        args.batch_size,
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+"""
+Offline microbenchmarks for the DSL executor.
+
+Every module used here is generated into a local directory, so no workflows
+API and no network access is needed. Dependency-install scenarios use a
+locally built wheel installed with ``--no-index``.
+
+Run all benchmarks and write the results:
+
+    python benchmarks/dsl_executor_bench.py --output results.json
+
+Store a baseline, then gate a change against it:
+
+    python benchmarks/dsl_executor_bench.py --output baseline.json
+    python benchmarks/dsl_executor_bench.py --compare baseline.json --threshold 0.15
+
+``--target bid_system`` benchmarks the executor vendored in bids_system
+instead of the one shipped with constraint_checker.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import zipfile
+import hashlib
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Callable, Dict, List
+
+SRC_DIR = Path(__file__).resolve().parents[2]
+
+TARGETS = {
+    "constraint_checker": (SRC_DIR / "constraint_checker_lib", "constraint_checker.dsl_executor"),
+    "bid_system": (SRC_DIR / "bid_system" / "bids_system", "core.dsl_executor"),
+}
+
+FUNCTION_TEMPLATE = '''
+class AgentSpaceV1PolicyRule:
+    def __init__(self, rule_id, settings, parameters, global_settings, global_parameters, global_state):
+        self.settings = settings
+        self.parameters = parameters
+
+    def eval(self, parameters, input_data, context):
+        {import_line}
+        best = None
+        for bid in input_data.get("bids", []):
+            if best is None or bid["bid_data"]["amount"] > best["bid_data"]["amount"]:
+                best = bid
+        return {{
+            "count": len(input_data.get("bids", [])),
+            "winner": best["bid_subject_id"] if best else None,
+            "upstream": len(input_data.get("previous_outputs", {{}})),
+        }}
+'''
+
+
+class SyntheticModules:
+    def __init__(self, root: Path):
+        self.root = root
+        self.wheel_dir = root / "wheels"
+        self.dependency_name = f"dslbench_dep_{uuid.uuid4().hex[:8]}"
+
+    def module_dir(self, name: str, with_dependency: bool = False) -> str:
+        path = self.root / "modules" / name
+        if path.exists():
+            return str(path)
+        path.mkdir(parents=True)
+        import_line = f"import {self.dependency_name}" if with_dependency else "pass"
+        (path / "function.py").write_text(
+            FUNCTION_TEMPLATE.format(import_line=import_line))
+        if with_dependency:
+            self._build_wheel()
+            (path / "requirements.txt").write_text(
+                f"--no-index\n--find-links {self.wheel_dir}\n{self.dependency_name}\n")
+        return str(path)
+
+    def _build_wheel(self):
+        name, version = self.dependency_name, "0.0.1"
+        wheel_path = self.wheel_dir / f"{name}-{version}-py3-none-any.whl"
+        if wheel_path.exists():
+            return
+        self.wheel_dir.mkdir(parents=True, exist_ok=True)
+        dist_info = f"{name}-{version}.dist-info"
+        files = {
+            f"{name}/__init__.py": "VALUE = 1\n",
+            f"{dist_info}/METADATA": f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n",
+            f"{dist_info}/WHEEL": "Wheel-Version: 1.0\nGenerator: dslbench\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+        }
+        record = []
+        with zipfile.ZipFile(wheel_path, "w") as wheel:
+            for file_name, content in files.items():
+                data = content.encode()
+                wheel.writestr(file_name, data)
+                digest = hashlib.sha256(data).digest().hex()
+                record.append(f"{file_name},sha256={digest},{len(data)}")
+            record.append(f"{dist_info}/RECORD,,")
+            wheel.writestr(f"{dist_info}/RECORD", "\n".join(record) + "\n")
+
+    def uninstall_dependency(self):
+        subprocess.call(
+            [sys.executable, "-m", "pip", "uninstall", "-y", "-q", self.dependency_name],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def make_dsl(modules: SyntheticModules, width: int = 1, depth: int = 1, with_dependency: bool = False) -> Dict:
+    dsl_modules, graph = {}, {}
+    for column in range(width):
+        chain = [f"m{column}_{level}" for level in range(depth)]
+        for index, key in enumerate(chain):
+            needs_dependency = with_dependency and index == 0
+            dsl_modules[key] = {
+                "codePath": modules.module_dir(f"{key}_dep" if needs_dependency else key, needs_dependency),
+                "settings": {},
+                "parameters": {},
+            }
+            graph[key] = [chain[index + 1]] if index + 1 < len(chain) else []
+    return {"globalSettings": {}, "globalParameters": {}, "modules": dsl_modules, "graph": graph}
+
+
+def make_bids(count: int) -> Dict:
+    return {"bids": [
+        {
+            "bid_id": str(index),
+            "bid_task_id": "bench",
+            "bid_subject_id": f"subject-{index}",
+            "bid_data": {"amount": (index * 7919) % 10007},
+        }
+        for index in range(count)
+    ]}
+
+
+def measure(fn: Callable[[], None], repeat: int) -> Dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": samples[0],
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "max_ms": samples[-1],
+    }
+
+
+class ExecutorBenchmarks:
+    def __init__(self, dsl_executor, modules: SyntheticModules, repeat: int, quick: bool):
+        self.dsl_executor = dsl_executor
+        self.modules = modules
+        self.repeat = repeat
+        self.quick = quick
+        self.executors = []
+
+    def _new_executor(self, dsl: Dict):
+        executor = self.dsl_executor.workflow_executor.DSLWorkflowExecutor(dsl)
+        self.executors.append(executor)
+        return executor
+
+    def _run(self, executor, payload: Dict):
+        output = executor.execute(payload)
+        return self.dsl_executor.parse_dsl_output(output)
+
+    def cold(self) -> Dict:
+        dsl, payload = make_dsl(self.modules), make_bids(10)
+        return measure(lambda: self._run(self._new_executor(dsl), payload), self.repeat)
+
+    def warm(self) -> Dict:
+        executor, payload = self._new_executor(make_dsl(self.modules)), make_bids(10)
+        self._run(executor, payload)
+        return measure(lambda: self._run(executor, payload), self.repeat)
+
+    def _warm_shape(self, width: int, depth: int) -> Dict:
+        executor = self._new_executor(make_dsl(self.modules, width=width, depth=depth))
+        payload = make_bids(10)
+        self._run(executor, payload)
+        return measure(lambda: self._run(executor, payload), self.repeat)
+
+    def width(self) -> Dict:
+        sizes = [1, 4, 16] if self.quick else [1, 4, 16, 64]
+        return {f"width={size}": self._warm_shape(size, 1) for size in sizes}
+
+    def depth(self) -> Dict:
+        sizes = [1, 4, 16] if self.quick else [1, 4, 16, 64]
+        return {f"depth={size}": self._warm_shape(1, size) for size in sizes}
+
+    def payload(self) -> Dict:
+        sizes = [10, 1000, 10000] if self.quick else [10, 1000, 10000, 100000]
+        executor = self._new_executor(make_dsl(self.modules))
+        results = {}
+        for size in sizes:
+            payload = make_bids(size)
+            self._run(executor, payload)
+            results[f"bids={size}"] = measure(
+                lambda: self._run(executor, payload), self.repeat)
+        return results
+
+    def dependencies(self) -> Dict:
+        dsl, payload = make_dsl(self.modules, with_dependency=True), make_bids(10)
+        self.modules.uninstall_dependency()
+        try:
+            results = {"first_install": measure(
+                lambda: self._run(self._new_executor(dsl), payload), 1)}
+            results["already_installed"] = measure(
+                lambda: self._run(self._new_executor(dsl), payload), max(1, self.repeat // 5))
+            return results
+        finally:
+            self.modules.uninstall_dependency()
+
+    def clean_up(self):
+        for executor in self.executors:
+            for module_executor in executor.local_code_executors.values():
+                if module_executor.temp_dir.exists():
+                    shutil.rmtree(module_executor.temp_dir, ignore_errors=True)
+        self.executors = []
+
+
+SUITES = ["cold", "warm", "width", "depth", "payload", "dependencies"]
+
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, Dict]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}/{key}" if prefix else key
+        if "median_ms" in value:
+            flat[name] = value
+        else:
+            flat.update(flatten(value, name))
+    return flat
+
+
+def run_benchmarks(target: str, suites: List[str], repeat: int, quick: bool) -> Dict:
+    target_path, module_name = TARGETS[target]
+    sys.path.insert(0, str(target_path))
+
+    with tempfile.TemporaryDirectory(prefix="dslbench-") as root:
+        # keep artifact and install caches private to this run
+        os.environ["DSL_ARTIFACT_CACHE_DIR"] = os.path.join(root, "cache")
+        import importlib
+        dsl_executor = importlib.import_module(module_name)
+        importlib.import_module(f"{module_name}.workflow_executor")
+        logging.getLogger().setLevel(logging.ERROR)
+
+        benchmarks = ExecutorBenchmarks(
+            dsl_executor, SyntheticModules(Path(root)), repeat, quick)
+        results = {}
+        try:
+            for suite in suites:
+                print(f"Running benchmark suite '{suite}'...", file=sys.stderr)
+                results[suite] = getattr(benchmarks, suite)()
+                benchmarks.clean_up()
+        finally:
+            benchmarks.clean_up()
+
+    return {
+        "meta": {
+            "target": target,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "quick": quick,
+            "timestamp": int(time.time()),
+        },
+        "results": flatten(results),
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, min_delta_ms: float) -> List[Dict]:
+    rows = []
+    for name, stats in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            rows.append({"name": name, "baseline_ms": None,
+                         "current_ms": stats["median_ms"], "change": None, "regressed": False})
+            continue
+        delta = stats["median_ms"] - base["median_ms"]
+        change = delta / max(base["median_ms"], 1e-9)
+        rows.append({"name": name, "baseline_ms": base["median_ms"], "current_ms": stats["median_ms"],
+                     "change": change, "regressed": change > threshold and delta > min_delta_ms})
+    return rows
+
+
+def print_report(report: Dict):
+    print(f"{'benchmark':<40}{'median ms':>12}{'p95 ms':>12}")
+    for name, stats in report["results"].items():
+        print(f"{name:<40}{stats['median_ms']:>12.3f}{stats['p95_ms']:>12.3f}")
+
+
+def print_comparison(rows: List[Dict], threshold: float):
+    print(f"{'benchmark':<40}{'baseline ms':>12}{'current ms':>12}{'change':>10}")
+    for row in rows:
+        baseline = "-" if row["baseline_ms"] is None else f"{row['baseline_ms']:.3f}"
+        change = "new" if row["change"] is None else f"{row['change'] * 100:+.1f}%"
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"{row['name']:<40}{baseline:>12}{row['current_ms']:>12.3f}{change:>10}{flag}")
+    regressions = [row for row in rows if row["regressed"]]
+    print(f"{len(regressions)} regression(s) above {threshold * 100:.0f}% threshold")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="DSL executor microbenchmarks")
+    parser.add_argument("--target", choices=sorted(TARGETS), default="constraint_checker")
+    parser.add_argument("--suite", action="append", choices=SUITES,
+                        help="suite to run, may be repeated (default: all)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--quick", action="store_true",
+                        help="use smaller graph and payload sizes")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="compare against a stored results file")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed relative median slowdown before failing")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5,
+                        help="ignore slowdowns smaller than this many milliseconds")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.target, args.suite or SUITES, args.repeat, args.quick)
+
+    rows = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold, args.min_delta_ms)
+        report["comparison"] = rows
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if rows is not None:
+        print_comparison(rows, args.threshold)
+        return 1 if any(row["regressed"] for row in rows) else 0
+
+    print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,20 @@
-from .constraints_manager import AsyncConstraintsManager, ConstraintsManager
+from .constraints_manager import AsyncConstraintsManager, ConstraintsManager, AioConstraintsManager
 from .constraint import ConstraintOutputWaiter
+from .worker_pool import ConstraintWorkerPool, ConstraintWorkerError
+from .verdict_cache import VerdictCache
+from .version_watcher import ConstraintVersionWatcher
+from .metrics import MetricsRegistry
+from .rules import RuleSet, compile_rules
 
 
-def new_constraints_manager():
-    return ConstraintsManager()
+def new_constraints_manager(verdict_cache: VerdictCache = None, drain_timeout: float = 30.0, metrics: MetricsRegistry = None):
+    return ConstraintsManager(verdict_cache, drain_timeout, metrics)
 
-def new_async_constraints_manager():
-    return AsyncConstraintsManager()
\ No newline at end of file
+def new_async_constraints_manager(pool_size: int = None, max_loaded_per_worker: int = 32, check_timeout: float = None, verdict_cache: VerdictCache = None, metrics: MetricsRegistry = None, max_workers: int = None):
+    return AsyncConstraintsManager(pool_size, max_loaded_per_worker, check_timeout, verdict_cache, metrics, max_workers)
+
+def new_aio_constraints_manager(pool_size: int = None, max_loaded_per_worker: int = 32, check_timeout: float = None, max_concurrency_per_type: int = 256, verdict_cache: VerdictCache = None, metrics: MetricsRegistry = None, max_workers: int = None):
+    return AioConstraintsManager(pool_size, max_loaded_per_worker, check_timeout, max_concurrency_per_type, verdict_cache, metrics, max_workers)
+
+def new_version_watcher(manager, interval: float = 30.0, workflows_base_uri: str = None):
+    return ConstraintVersionWatcher(manager, interval, workflows_base_uri)
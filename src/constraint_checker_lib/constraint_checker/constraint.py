@@ -1,94 +1,233 @@
 import os
-from multiprocessing import Process, Queue
-import logging
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, CancelledError, TimeoutError as FutureTimeoutError
 
 from .dsl_executor import new_dsl_workflow_executor, parse_dsl_output
 from .dsl_executor.workflow_executor import DSLWorkflowExecutor
+from .worker_pool import ConstraintWorkerPool
+from .rules import RuleSet, is_rejected
 
 
 class ConstraintWrapper:
 
-    def __init__(self, message_type: str, subject_id: str, dsl_workflow_id: str) -> None:
+    def __init__(self, message_type: str, subject_id: str, dsl_workflow_id: str, use_cache: bool = True, rules: RuleSet = None) -> None:
         self.message_type = message_type
         self.subject_id = subject_id
         self.dsl_workflow_id = dsl_workflow_id
-        self.dsl = self._load_constraint_dsl(self.dsl_workflow_id)
-
-    def _load_constraint_dsl(self, dsl_workflow_id):
+        self.rules = rules
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        # a constraint made only of rules has no workflow to load
+        self.dsl = self._load_constraint_dsl(
+            self.dsl_workflow_id, use_cache) if dsl_workflow_id else None
+
+    def _load_constraint_dsl(self, dsl_workflow_id, use_cache: bool = True):
         try:
 
             # TODO: connect with the subject's DB, for now DSL is passed through parameter
             dsl = new_dsl_workflow_executor(
-                dsl_workflow_id, os.getenv("DSL_DB_URL"))
+                dsl_workflow_id, os.getenv("DSL_DB_URL"), use_cache)
+            # download and install up front so the first check does not pay for it
+            dsl.prepare()
             return dsl
 
         except Exception as e:
             raise e
 
+    @contextmanager
+    def _track(self):
+        with self._idle:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._in_flight -= 1
+                if self._in_flight == 0:
+                    self._idle.notify_all()
+
+    def drain(self, timeout: float = None) -> bool:
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+
     def _execute(self, input_data):
         try:
 
-            output = self.dsl.execute(input_data)
+            with self._track():
+                if self.rules is not None:
+                    # cheap rules run first, a rejected packet never reaches the DSL
+                    verdict = self.rules.verdict(input_data)
+                    if is_rejected(verdict) or self.dsl is None:
+                        return verdict
+                output = self.dsl.execute(input_data)
             return parse_dsl_output(output, "")
 
         except Exception as e:
             raise e
 
+    def _execute_batch(self, packets: list) -> list:
+        outputs = []
+        with self._track():
+            for input_data in packets:
+                try:
+                    outputs.append(self._execute(input_data))
+                except Exception as e:
+                    outputs.append(e)
+        return outputs
+
     def get_metadata(self):
-        return {
-            "settings": self.dsl.global_settings,
-            "parameters": self.dsl.global_parameters,
-            "modules": self.dsl.modules
-        }
+        metadata = {}
+        if self.dsl is not None:
+            metadata.update({
+                "settings": self.dsl.global_settings,
+                "parameters": self.dsl.global_parameters,
+                "modules": self.dsl.modules
+            })
+        if self.rules is not None:
+            metadata["rules"] = self.rules.spec
+        return metadata
 
     def clean_up(self):
         try:
-            self.dsl.clean_up()
+            if self.dsl is not None:
+                self.dsl.clean_up()
         except Exception as e:
             raise e
 
 
 class ConstraintOutputWaiter:
-    def __init__(self, output_queue: Queue):
-        self._output_queue = output_queue
+    def __init__(self, future: Future, cancel_callback=None, default_timeout: float = None):
+        self._future = future
+        self._cancel_callback = cancel_callback
+        self._default_timeout = default_timeout
 
-    def wait(self):
-        return self._output_queue.get()
+    def result(self, timeout: float = None):
+        return self._future.result(self._default_timeout if timeout is None else timeout)
 
+    def wait(self, timeout: float = None):
+        # returns a failed check's exception instead of raising it
+        try:
+            return self.result(timeout)
+        except (TimeoutError, FutureTimeoutError):
+            self.cancel()
+            raise
+        except CancelledError:
+            raise
+        except Exception as e:
+            return e
 
-class AsyncConstraintWrapper:
-    def __init__(self, message_type: str, subject_id: str, dsl_workflow_id: str):
-        self.message_type = message_type
-        self.subject_id = subject_id
-        self.dsl_workflow_id = dsl_workflow_id
-        self.input_queue = Queue()
-        self.process = Process(target=self._run_dsl_process)
-        self.process.start()
+    def cancel(self) -> bool:
+        if self._cancel_callback is not None:
+            return self._cancel_callback()
+        return self._future.cancel()
 
-    def _run_dsl_process(self):
+    def cancelled(self) -> bool:
+        return self._future.cancelled()
 
-        try:
-            from .dsl_executor import new_dsl_workflow_executor, parse_dsl_output
+    def done(self) -> bool:
+        return self._future.done()
 
-            dsl = new_dsl_workflow_executor(
-                self.dsl_workflow_id, os.getenv("DSL_DB_URL"))
-            while True:
-                input_data, output_queue = self.input_queue.get()
-                try:
-                    output = dsl.execute(input_data)
-                    parsed_output = parse_dsl_output(output, "")
-                    output_queue.put(parsed_output)
-                except Exception as e:
-                    output_queue.put(e)
-        except Exception as e:
-            logging.error(
-                f"DSL process for message type '{self.message_type}' encountered an error: {e}")
+    def add_done_callback(self, fn):
+        self._future.add_done_callback(fn)
+
+    def __await__(self):
+        return asyncio.wrap_future(self._future).__await__()
+
+
+def resolved_waiter(output) -> ConstraintOutputWaiter:
+    future = Future()
+    future.set_result(output)
+    return ConstraintOutputWaiter(future)
+
+
+def merge_partial(waiter: ConstraintOutputWaiter, outputs: list, indices: list, default_timeout: float = None, on_output=None) -> ConstraintOutputWaiter:
+    # fills the waiter's batch results into outputs at indices, the rest were answered up front
+    combined = Future()
 
-    def add_task(self, input_data):
-        output_queue = Queue(maxsize=1)
-        self.input_queue.put((input_data, output_queue))
-        return ConstraintOutputWaiter(output_queue)
+    def merge(future):
+        if future.cancelled():
+            combined.cancel()
+            return
+        if not combined.set_running_or_notify_cancel():
+            return
+        if future.exception() is not None:
+            combined.set_exception(future.exception())
+            return
+        for index, output in zip(indices, future.result()):
+            outputs[index] = output
+            if on_output is not None:
+                on_output(index, output)
+        combined.set_result(outputs)
+
+    waiter.add_done_callback(merge)
+    return ConstraintOutputWaiter(combined, waiter.cancel, default_timeout)
+
+
+class AsyncConstraintWrapper:
+    def __init__(self, message_type: str, subject_id: str, dsl_workflow_id: str, pool: ConstraintWorkerPool = None, check_timeout: float = None, version: str = None, rules: RuleSet = None):
+        self.message_type = message_type
+        self.subject_id = subject_id
+        self.dsl_workflow_id = dsl_workflow_id
+        self.check_timeout = check_timeout
+        self.version = version or dsl_workflow_id
+        self.rules = rules
+        self._owns_pool = pool is None and dsl_workflow_id is not None
+        self.pool = pool or (ConstraintWorkerPool(
+            pool_size=1) if self._owns_pool else None)
+        if dsl_workflow_id is None:
+            self._ready = Future()
+            self._ready.set_result(True)
+        else:
+            _, self._ready = self.pool.warm(
+                self.message_type, self.dsl_workflow_id, self.version)
+
+    def wait_ready(self, timeout: float = None):
+        return self._ready.result(timeout)
+
+    def add_ready_callback(self, fn):
+        self._ready.add_done_callback(fn)
+
+    def _waiter(self, request_id: int, future: Future) -> ConstraintOutputWaiter:
+        return ConstraintOutputWaiter(
+            future, lambda: self.pool.cancel(request_id), self.check_timeout)
+
+    def add_task(self, input_data, priority: str = "normal"):
+        if self.rules is not None:
+            # rejected packets are answered in-process without a worker round trip
+            verdict = self.rules.verdict(input_data)
+            if is_rejected(verdict) or self.dsl_workflow_id is None:
+                return resolved_waiter(verdict)
+        request_id, future = self.pool.submit(
+            self.message_type, self.dsl_workflow_id, input_data, self.version, priority)
+        return self._waiter(request_id, future)
+
+    def add_batch(self, packets: list, priority: str = "normal"):
+        if self.rules is None:
+            request_id, future = self.pool.submit_batch(
+                self.message_type, self.dsl_workflow_id, packets, self.version, priority)
+            return self._waiter(request_id, future)
+
+        outputs = [None] * len(packets)
+        passed = []
+        for index, packet in enumerate(packets):
+            verdict = self.rules.verdict(packet)
+            if not is_rejected(verdict) and self.dsl_workflow_id is not None:
+                passed.append(index)
+            else:
+                outputs[index] = verdict
+        if not passed:
+            return resolved_waiter(outputs)
+
+        request_id, future = self.pool.submit_batch(
+            self.message_type, self.dsl_workflow_id, [packets[index] for index in passed], self.version, priority)
+        return merge_partial(self._waiter(request_id, future), outputs, passed, self.check_timeout)
 
     def clean_up(self):
-        self.process.terminate()
-        self.process.join()
+        if self.pool is None:
+            return
+        if self._owns_pool:
+            self.pool.shutdown()
+        else:
+            self.pool.unload(self.message_type, self.version)
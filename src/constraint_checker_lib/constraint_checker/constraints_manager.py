@@ -1,42 +1,332 @@
+import time
+import asyncio
 import logging
-from .constraint import ConstraintWrapper, AsyncConstraintWrapper, ConstraintOutputWaiter
+import itertools
+import threading
+from concurrent.futures import Future
+from .constraint import ConstraintWrapper, AsyncConstraintWrapper, ConstraintOutputWaiter, resolved_waiter, merge_partial
+from .worker_pool import ConstraintWorkerPool
+from .verdict_cache import VerdictCache
+from .metrics import MetricsRegistry
+from .rules import RuleSet, compile_rules, is_rejected
 
 logging.basicConfig(level=logging.INFO)
 
+_generations = itertools.count(1)
+_NOT_RUN = object()
+
+
+def _chain_constraints(constraints: dict, message_types: list) -> list:
+    if not message_types:
+        raise ValueError("A constraint chain needs at least one message type.")
+    missing = [message_type for message_type in message_types
+               if message_type not in constraints]
+    if missing:
+        raise ValueError(
+            f"Constraints for message types {', '.join(missing)} are not loaded.")
+    return [constraints[message_type] for message_type in message_types]
+
+
+def _chain_result(stages: list) -> dict:
+    # stages are (message_type, output) for every stage that ran, the chain stops at the first rejection
+    results = [{"message_type": message_type, "allowed": not is_rejected(output), "output": output}
+               for message_type, output in stages]
+    rejected_by = next((result["message_type"]
+                       for result in results if not result["allowed"]), None)
+    return {"allowed": rejected_by is None, "rejected_by": rejected_by, "stages": results}
+
+
+class _InFlightCall:
+    __slots__ = ("event", "error")
 
-class ConstraintsManager:
     def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+
+
+class _SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            owner = call is None
+            if owner:
+                call = self._calls[key] = _InFlightCall()
+
+        if not owner:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return
+
+        try:
+            fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class _VerdictCacheMixin:
+    def _init_verdict_cache(self, verdict_cache: VerdictCache = None):
+        self._verdict_cache = verdict_cache
+        self._versions = {}
+
+    def _next_version(self, dsl_workflow_id: str) -> str:
+        # a new generation on every load keeps verdicts from older loads unreachable
+        return f"{dsl_workflow_id or 'rules'}@{next(_generations)}"
+
+    def _set_version(self, message_type: str, version: str):
+        self._versions[message_type] = version
+        if self._verdict_cache is not None:
+            self._verdict_cache.invalidate(message_type)
+
+    def _drop_version(self, message_type: str):
+        self._versions.pop(message_type, None)
+        if self._verdict_cache is not None:
+            self._verdict_cache.invalidate(message_type)
+
+    def _cache_key(self, message_type: str, input_data):
+        if self._verdict_cache is None or message_type not in self._versions:
+            return None
+        return self._verdict_cache.make_key(message_type, self._versions[message_type], input_data)
+
+    def _cache_get(self, key):
+        if key is None:
+            return False, None
+        return self._verdict_cache.get(key)
+
+    def _cache_put(self, key, output):
+        if key is not None and not isinstance(output, Exception):
+            self._verdict_cache.put(key, output)
+
+    def get_cache_stats(self):
+        if self._verdict_cache is None:
+            return None
+        return self._verdict_cache.stats()
+
+
+class _MetricsMixin:
+    def _init_metrics(self, metrics: MetricsRegistry = None):
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.add_collector(self._collect_metrics)
+
+    def _record_check(self, message_type: str, outcome: str, started: float = None, count: int = 1):
+        if self.metrics is None:
+            return
+        self.metrics.inc("constraint_checks_total", count,
+                         message_type=message_type, outcome=outcome)
+        if started is not None:
+            self.metrics.observe("constraint_check_seconds",
+                                 time.perf_counter() - started, message_type=message_type)
+
+    def _record_batch(self, message_type: str, outputs: list, started: float):
+        if self.metrics is None:
+            return
+        errors = sum(1 for output in outputs if isinstance(output, Exception))
+        self.metrics.observe("constraint_batch_seconds",
+                             time.perf_counter() - started, message_type=message_type)
+        if len(outputs) - errors:
+            self._record_check(message_type, "ok", count=len(outputs) - errors)
+        if errors:
+            self._record_check(message_type, "error", count=errors)
+            self._record_error(message_type, "check", errors)
+
+    def _record_error(self, message_type: str, stage: str, count: int = 1):
+        if self.metrics is not None:
+            self.metrics.inc("constraint_errors_total", count,
+                             message_type=message_type, stage=stage)
+
+    def _record_load(self, message_type: str, kind: str, started: float):
+        if self.metrics is not None:
+            self.metrics.observe("constraint_load_seconds",
+                                 time.perf_counter() - started, message_type=message_type, kind=kind)
+
+    def _check_observer(self, message_type: str, started: float):
+        def observe(future):
+            if future.cancelled():
+                self._record_check(message_type, "cancelled", started)
+            elif future.exception() is not None:
+                self._record_check(message_type, "error", started)
+                self._record_error(message_type, "check")
+            else:
+                self._record_check(message_type, "ok", started)
+        return observe
+
+    def _collect_metrics(self):
+        return []
+
+
+class _HotReloadMixin:
+    def _init_reloads(self):
+        self._reloads = {}
+
+    def get_loaded_constraints(self):
+        with self._lock:
+            return {
+                message_type: (constraint.subject_id, constraint.dsl_workflow_id)
+                for message_type, constraint in self._constraints.items()
+            }
+
+    def reload(self, message_type: str, dsl_workflow_id: str = None, subject_id: str = None, rules=None) -> Future:
+        # checks keep running on the current version until the new one is warm
+        with self._lock:
+            current = self._constraints.get(message_type)
+            if current is None:
+                raise ValueError(
+                    f"Constraint for message type '{message_type}' is not loaded.")
+            future = self._reloads.get(message_type)
+            if future is not None:
+                logging.info(
+                    f"Reload for message type '{message_type}' is already in progress.")
+                return future
+            future = self._reloads[message_type] = Future()
+
+        threading.Thread(
+            target=self._run_reload,
+            args=(message_type, subject_id or current.subject_id,
+                  dsl_workflow_id or current.dsl_workflow_id,
+                  current.rules if rules is None else compile_rules(rules), future),
+            name=f"constraint-reload-{message_type}",
+            daemon=True
+        ).start()
+        return future
+
+    def _run_reload(self, message_type: str, subject_id: str, dsl_workflow_id: str, rules: RuleSet, future: Future):
+        error = None
+        started = time.perf_counter()
+        version = self._next_version(dsl_workflow_id)
+        try:
+            logging.info(
+                f"Reloading constraint for message type '{message_type}'...")
+            replacement = self._build_replacement(
+                message_type, subject_id, dsl_workflow_id, version, rules)
+
+            with self._lock:
+                previous = self._constraints.get(message_type)
+                if previous is not None:
+                    self._constraints[message_type] = replacement
+                    self._set_version(message_type, version)
+
+            if previous is None:
+                self._retire(replacement)
+                raise ValueError(
+                    f"Constraint for message type '{message_type}' was unloaded during reload.")
+
+            self._record_load(message_type, "reload", started)
+            self._retire(previous)
+            logging.info(
+                f"Constraint for message type '{message_type}' reloaded as version '{version}'.")
+        except Exception as e:
+            logging.error(
+                f"Failed to reload constraint for message type '{message_type}': {e}")
+            self._record_error(message_type, "reload")
+            error = e
+        finally:
+            with self._lock:
+                self._reloads.pop(message_type, None)
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(version)
+
+
+class ConstraintsManager(_VerdictCacheMixin, _HotReloadMixin, _MetricsMixin):
+    def __init__(self, verdict_cache: VerdictCache = None, drain_timeout: float = 30.0, metrics: MetricsRegistry = None):
         self._constraints = {}
+        self._lock = threading.Lock()
+        self._loads = _SingleFlight()
+        self._drain_timeout = drain_timeout
+        self._init_verdict_cache(verdict_cache)
+        self._init_reloads()
+        self._init_metrics(metrics)
 
-    def load(self, message_type: str, subject_id: str, dsl_workflow_id: str):
+    def load(self, message_type: str, subject_id: str, dsl_workflow_id: str, rules=None):
         try:
             if message_type in self._constraints:
                 logging.info(
                     f"Constraint for message type '{message_type}' is already loaded.")
                 return
+            if dsl_workflow_id is None and rules is None:
+                raise ValueError(
+                    f"Constraint for message type '{message_type}' needs a DSL workflow or rules.")
+            rules = compile_rules(rules)
 
-            logging.info(
-                f"Loading constraint for message type '{message_type}'...")
-            self._constraints[message_type] = ConstraintWrapper(
-                message_type, subject_id, dsl_workflow_id)
-            logging.info(
-                f"Constraint for message type '{message_type}' loaded successfully.")
+            # concurrent loads of the same message type wait on a single build
+            self._loads.do(message_type, lambda: self._load(
+                message_type, subject_id, dsl_workflow_id, rules))
         except Exception as e:
             logging.error(
                 f"Failed to load constraint for message type '{message_type}': {e}")
+            self._record_error(message_type, "load")
             raise
 
+    def _load(self, message_type: str, subject_id: str, dsl_workflow_id: str, rules: RuleSet = None):
+        if message_type in self._constraints:
+            return
+
+        logging.info(
+            f"Loading constraint for message type '{message_type}'...")
+        started = time.perf_counter()
+        constraint = ConstraintWrapper(
+            message_type, subject_id, dsl_workflow_id, rules=rules)
+        self._record_load(message_type, "load", started)
+        with self._lock:
+            self._constraints[message_type] = constraint
+            self._set_version(
+                message_type, self._next_version(dsl_workflow_id))
+        logging.info(
+            f"Constraint for message type '{message_type}' loaded successfully.")
+
+    def _build_replacement(self, message_type: str, subject_id: str, dsl_workflow_id: str, version: str, rules: RuleSet = None) -> ConstraintWrapper:
+        return ConstraintWrapper(
+            message_type, subject_id, dsl_workflow_id, use_cache=False, rules=rules)
+
+    def _retire(self, constraint: ConstraintWrapper):
+        if not constraint.drain(self._drain_timeout):
+            logging.warning(
+                f"Constraint for message type '{constraint.message_type}' still had checks in flight after {self._drain_timeout}s, cleaning up anyway.")
+        constraint.clean_up()
+
+    def _collect_metrics(self):
+        with self._lock:
+            constraints = list(self._constraints.items())
+        return [
+            ("constraint_in_flight", {"message_type": message_type},
+             constraint._in_flight)
+            for message_type, constraint in constraints
+        ]
+
+    def _get_or_load(self, message_type: str, subject_id: str, dsl_workflow_id: str) -> ConstraintWrapper:
+        constraint = self._constraints.get(message_type)
+        if constraint is None:
+            self.load(message_type, subject_id, dsl_workflow_id)
+            constraint = self._constraints[message_type]
+        return constraint
+
     def unload(self, message_type: str):
         try:
-            if message_type not in self._constraints:
+            with self._lock:
+                constraint = self._constraints.pop(message_type, None)
+                if constraint is not None:
+                    self._drop_version(message_type)
+
+            if constraint is None:
                 logging.info(
                     f"Constraint for message type '{message_type}' is not loaded.")
                 return
 
             logging.info(
                 f"Unloading constraint for message type '{message_type}'...")
-            self._constraints[message_type].clean_up()
-            del self._constraints[message_type]
+            constraint.clean_up()
             logging.info(
                 f"Constraint for message type '{message_type}' unloaded successfully.")
         except Exception as e:
@@ -46,26 +336,102 @@ class ConstraintsManager:
 
     def check_constraint_and_convert_packet(self, message_type: str, input_data, subject_id: str, dsl_workflow_id: str):
         try:
-            if message_type not in self._constraints:
-                self.load(message_type, subject_id, dsl_workflow_id)
+            constraint = self._get_or_load(
+                message_type, subject_id, dsl_workflow_id)
+
+            key = self._cache_key(message_type, input_data)
+            hit, output = self._cache_get(key)
+            if hit:
+                self._record_check(message_type, "cached")
+                return output
 
             logging.info(
                 f"Executing constraint for message type '{message_type}'...")
-            return self._constraints[message_type]._execute(input_data)
+            started = time.perf_counter()
+            try:
+                output = constraint._execute(input_data)
+            except Exception:
+                self._record_check(message_type, "error", started)
+                self._record_error(message_type, "check")
+                raise
+            self._record_check(message_type, "ok", started)
+            self._cache_put(key, output)
+            return output
         except Exception as e:
             logging.error(
                 f"Execution failed for message type '{message_type}': {e}")
             raise
 
+    def check_batch(self, message_type: str, packets: list, subject_id: str = None, dsl_workflow_id: str = None) -> list:
+        try:
+            if message_type not in self._constraints and dsl_workflow_id is None:
+                raise ValueError(
+                    f"Constraint for message type '{message_type}' is not loaded.")
+            constraint = self._get_or_load(
+                message_type, subject_id, dsl_workflow_id)
+
+            keys = [self._cache_key(message_type, packet) for packet in packets]
+            outputs = [None] * len(packets)
+            misses = []
+            for index, key in enumerate(keys):
+                hit, output = self._cache_get(key)
+                if hit:
+                    outputs[index] = output
+                else:
+                    misses.append(index)
+
+            if len(misses) < len(packets):
+                self._record_check(message_type, "cached",
+                                   count=len(packets) - len(misses))
+            if misses:
+                logging.info(
+                    f"Executing constraint batch of {len(misses)} packets for message type '{message_type}'...")
+                started = time.perf_counter()
+                results = constraint._execute_batch(
+                    [packets[index] for index in misses])
+                self._record_batch(message_type, results, started)
+                for index, output in zip(misses, results):
+                    outputs[index] = output
+                    self._cache_put(keys[index], output)
+            return outputs
+        except Exception as e:
+            logging.error(
+                f"Batch execution failed for message type '{message_type}': {e}")
+            raise
+
+    def check_chain(self, message_types: list, input_data) -> dict:
+        try:
+            with self._lock:
+                constraints = _chain_constraints(
+                    self._constraints, message_types)
+
+            logging.info(
+                f"Executing constraint chain {', '.join(message_types)}...")
+            stages = []
+            for constraint in constraints:
+                try:
+                    output = constraint._execute(input_data)
+                except Exception as e:
+                    output = e
+                stages.append((constraint.message_type, output))
+                if is_rejected(output):
+                    break
+            return _chain_result(stages)
+        except Exception as e:
+            logging.error(
+                f"Chain execution failed for message types {', '.join(message_types)}: {e}")
+            raise
+
     def get_metadata(self, message_type: str):
         try:
-            if message_type not in self._constraints:
+            constraint = self._constraints.get(message_type)
+            if constraint is None:
                 raise ValueError(
                     f"Constraint for message type '{message_type}' is not loaded.")
 
             logging.info(
                 f"Getting metadata for message type '{message_type}'...")
-            return self._constraints[message_type].get_metadata()
+            return constraint.get_metadata()
         except Exception as e:
             logging.error(
                 f"Failed to get metadata for message type '{message_type}': {e}")
@@ -73,52 +439,135 @@ class ConstraintsManager:
 
     def clean_up(self, message_type: str):
         try:
-            if message_type not in self._constraints:
+            constraint = self._constraints.get(message_type)
+            if constraint is None:
                 raise ValueError(
                     f"Constraint for message type '{message_type}' is not loaded.")
 
             logging.info(
                 f"Cleaning up constraint for message type '{message_type}'...")
-            self._constraints[message_type].clean_up()
+            constraint.clean_up()
         except Exception as e:
             logging.error(
                 f"Failed to clean up for message type '{message_type}': {e}")
             raise
 
 
-class AsyncConstraintsManager:
-    def __init__(self):
+class AsyncConstraintsManager(_VerdictCacheMixin, _HotReloadMixin, _MetricsMixin):
+    def __init__(self, pool_size: int = None, max_loaded_per_worker: int = 32, check_timeout: float = None, verdict_cache: VerdictCache = None, metrics: MetricsRegistry = None, max_workers: int = None):
         self._constraints = {}
+        self._check_timeout = check_timeout
+        self._lock = threading.Lock()
+        self._loads = _SingleFlight()
+        self._init_verdict_cache(verdict_cache)
+        self._init_reloads()
+        self._pool = ConstraintWorkerPool(
+            pool_size=pool_size, max_loaded_per_worker=max_loaded_per_worker, max_workers=max_workers)
+        self._init_metrics(metrics)
 
-    def load(self, message_type: str, subject_id: str, dsl_workflow_id: str):
+    def load(self, message_type: str, subject_id: str, dsl_workflow_id: str, rules=None):
         try:
             if message_type in self._constraints:
                 logging.info(
                     f"Async constraint for message type '{message_type}' is already loaded.")
                 return
+            if dsl_workflow_id is None and rules is None:
+                raise ValueError(
+                    f"Async constraint for message type '{message_type}' needs a DSL workflow or rules.")
+            rules = compile_rules(rules)
 
-            logging.info(
-                f"Loading async constraint for message type '{message_type}'...")
-            self._constraints[message_type] = AsyncConstraintWrapper(
-                message_type, subject_id, dsl_workflow_id)
-            logging.info(
-                f"Async constraint for message type '{message_type}' loaded successfully.")
+            self._loads.do(message_type, lambda: self._load(
+                message_type, subject_id, dsl_workflow_id, rules))
         except Exception as e:
             logging.error(
                 f"Failed to load async constraint for message type '{message_type}': {e}")
+            self._record_error(message_type, "load")
+            raise
+
+    def _load(self, message_type: str, subject_id: str, dsl_workflow_id: str, rules: RuleSet = None):
+        if message_type in self._constraints:
+            return
+
+        logging.info(
+            f"Loading async constraint for message type '{message_type}'...")
+        version = self._next_version(dsl_workflow_id)
+        started = time.perf_counter()
+        constraint = AsyncConstraintWrapper(
+            message_type, subject_id, dsl_workflow_id, self._pool, self._check_timeout, version, rules)
+
+        # the worker loads in the background, so time it when the warm-up replies
+        def loaded(future):
+            if future.cancelled() or future.exception() is not None:
+                self._record_error(message_type, "load")
+            else:
+                self._record_load(message_type, "load", started)
+        constraint.add_ready_callback(loaded)
+
+        with self._lock:
+            self._constraints[message_type] = constraint
+            self._set_version(message_type, version)
+        logging.info(
+            f"Async constraint for message type '{message_type}' loaded successfully.")
+
+    def _build_replacement(self, message_type: str, subject_id: str, dsl_workflow_id: str, version: str, rules: RuleSet = None) -> AsyncConstraintWrapper:
+        constraint = AsyncConstraintWrapper(
+            message_type, subject_id, dsl_workflow_id, self._pool, self._check_timeout, version, rules)
+        try:
+            constraint.wait_ready()
+        except Exception:
+            constraint.clean_up()
             raise
+        return constraint
+
+    def _retire(self, constraint: AsyncConstraintWrapper):
+        # the unload is queued behind checks already sent to the old version
+        constraint.clean_up()
+
+    def _collect_metrics(self):
+        gauges = []
+        for worker in self._pool.stats():
+            labels = {"worker_id": worker["worker_id"]}
+            gauges.append(("constraint_worker_in_flight",
+                          labels, worker["outstanding"]))
+            if worker["queue_depth"] is not None:
+                gauges.append(("constraint_worker_queue_depth",
+                              labels, worker["queue_depth"]))
+            gauges.append(("constraint_worker_alive",
+                          labels, int(worker["alive"])))
+            gauges.append(("constraint_worker_restarts",
+                          labels, worker["restarts"]))
+        for message_type, lanes in self._pool.backlog().items():
+            for priority, depth in lanes.items():
+                gauges.append(("constraint_backlog", {
+                              "message_type": message_type, "priority": priority}, depth))
+        for message_type, health in self._pool.health().items():
+            gauges.append(("constraint_consecutive_failures", {
+                          "message_type": message_type}, health["consecutive_failures"]))
+        return gauges
+
+    def _get_or_load(self, message_type: str, subject_id: str, dsl_workflow_id: str) -> AsyncConstraintWrapper:
+        constraint = self._constraints.get(message_type)
+        if constraint is None:
+            self.load(message_type, subject_id, dsl_workflow_id)
+            constraint = self._constraints[message_type]
+        return constraint
 
     def unload(self, message_type: str):
         try:
-            if message_type not in self._constraints:
+            with self._lock:
+                constraint = self._constraints.pop(message_type, None)
+                if constraint is not None:
+                    self._drop_version(message_type)
+
+            if constraint is None:
                 logging.info(
                     f"Async constraint for message type '{message_type}' is not loaded.")
                 return
 
             logging.info(
                 f"Unloading async constraint for message type '{message_type}'...")
-            self._constraints[message_type].clean_up()
-            del self._constraints[message_type]
+            constraint.clean_up()
+            self._pool.forget_health(message_type)
             logging.info(
                 f"Async constraint for message type '{message_type}' unloaded successfully.")
         except Exception as e:
@@ -126,16 +575,248 @@ class AsyncConstraintsManager:
                 f"Failed to unload async constraint for message type '{message_type}': {e}")
             raise
 
-    def check_constraint_and_convert_packet(self, message_type: str, input_data, subject_id: str, dsl_workflow_id: str):
+    def check_constraint_and_convert_packet(self, message_type: str, input_data, subject_id: str, dsl_workflow_id: str, priority: str = "normal"):
         try:
-            if message_type not in self._constraints:
-                self.load(message_type, subject_id, dsl_workflow_id)
+            constraint = self._get_or_load(
+                message_type, subject_id, dsl_workflow_id)
+
+            key = self._cache_key(message_type, input_data)
+            hit, output = self._cache_get(key)
+            if hit:
+                self._record_check(message_type, "cached")
+                return resolved_waiter(output)
 
             logging.info(
                 f"Executing async constraint for message type '{message_type}'...")
-            constraint = self._constraints[message_type]
-            return constraint.add_task(input_data)
+            started = time.perf_counter()
+            waiter = constraint.add_task(input_data, priority)
+            if self.metrics is not None:
+                waiter.add_done_callback(
+                    self._check_observer(message_type, started))
+            if key is not None:
+                def store(future):
+                    if not future.cancelled() and future.exception() is None:
+                        self._cache_put(key, future.result())
+                waiter.add_done_callback(store)
+            return waiter
         except Exception as e:
             logging.error(
                 f"Execution failed for message type '{message_type}': {e}")
             raise
+
+    def check_batch(self, message_type: str, packets: list, subject_id: str = None, dsl_workflow_id: str = None, priority: str = "normal") -> ConstraintOutputWaiter:
+        try:
+            if message_type not in self._constraints and dsl_workflow_id is None:
+                raise ValueError(
+                    f"Async constraint for message type '{message_type}' is not loaded.")
+            constraint = self._get_or_load(
+                message_type, subject_id, dsl_workflow_id)
+
+            if self._verdict_cache is None:
+                logging.info(
+                    f"Executing async constraint batch of {len(packets)} packets for message type '{message_type}'...")
+                waiter = constraint.add_batch(packets, priority)
+                if self.metrics is not None:
+                    waiter.add_done_callback(
+                        self._batch_observer(message_type, time.perf_counter()))
+                return waiter
+
+            keys = [self._cache_key(message_type, packet) for packet in packets]
+            outputs = [None] * len(packets)
+            misses = []
+            for index, key in enumerate(keys):
+                hit, output = self._cache_get(key)
+                if hit:
+                    outputs[index] = output
+                else:
+                    misses.append(index)
+            if len(misses) < len(packets):
+                self._record_check(message_type, "cached",
+                                   count=len(packets) - len(misses))
+            if not misses:
+                return resolved_waiter(outputs)
+
+            logging.info(
+                f"Executing async constraint batch of {len(misses)} packets for message type '{message_type}'...")
+            waiter = constraint.add_batch(
+                [packets[index] for index in misses], priority)
+            if self.metrics is not None:
+                waiter.add_done_callback(
+                    self._batch_observer(message_type, time.perf_counter()))
+            return merge_partial(waiter, outputs, misses, self._check_timeout,
+                                 lambda index, output: self._cache_put(keys[index], output))
+        except Exception as e:
+            logging.error(
+                f"Batch execution failed for message type '{message_type}': {e}")
+            raise
+
+    def check_chain(self, message_types: list, input_data, priority: str = "normal") -> ConstraintOutputWaiter:
+        try:
+            with self._lock:
+                constraints = _chain_constraints(
+                    self._constraints, message_types)
+
+            # every stage's rules run here first; only the DSL stages before the first
+            # rule rejection are sent, together, to a single worker
+            planned = []
+            for constraint in constraints:
+                verdict = constraint.rules.verdict(
+                    input_data) if constraint.rules is not None else None
+                planned.append((constraint, verdict))
+                if verdict is not None and is_rejected(verdict):
+                    break
+            remote = [constraint for constraint, verdict in planned
+                      if constraint.dsl_workflow_id is not None and (verdict is None or not is_rejected(verdict))]
+
+            def assemble(outputs: list) -> dict:
+                outputs = iter(outputs)
+                stages = []
+                for constraint, verdict in planned:
+                    if constraint.dsl_workflow_id is None or (verdict is not None and is_rejected(verdict)):
+                        output = verdict
+                    else:
+                        output = next(outputs, _NOT_RUN)
+                        if output is _NOT_RUN:
+                            break
+                    stages.append((constraint.message_type, output))
+                    if is_rejected(output):
+                        break
+                return _chain_result(stages)
+
+            if not remote:
+                return resolved_waiter(assemble([]))
+
+            logging.info(
+                f"Executing async constraint chain {', '.join(message_types)}...")
+            request_id, future = self._pool.submit_chain(
+                [(constraint.message_type, constraint.dsl_workflow_id, constraint.version)
+                 for constraint in remote], input_data, priority)
+            combined = Future()
+
+            def finish(done: Future):
+                if done.cancelled():
+                    combined.cancel()
+                    return
+                if not combined.set_running_or_notify_cancel():
+                    return
+                if done.exception() is not None:
+                    combined.set_exception(done.exception())
+                    return
+                combined.set_result(assemble(done.result()))
+
+            future.add_done_callback(finish)
+            return ConstraintOutputWaiter(combined, lambda: self._pool.cancel(request_id), self._check_timeout)
+        except Exception as e:
+            logging.error(
+                f"Chain execution failed for message types {', '.join(message_types)}: {e}")
+            raise
+
+    def _batch_observer(self, message_type: str, started: float):
+        def observe(future):
+            if future.cancelled():
+                self._record_check(message_type, "cancelled")
+            elif future.exception() is not None:
+                self._record_check(message_type, "error")
+                self._record_error(message_type, "check")
+            else:
+                self._record_batch(message_type, future.result(), started)
+        return observe
+
+    def set_scaling(self, message_type: str, min_replicas: int = 1, max_replicas: int = None):
+        self._pool.set_scaling(message_type, min_replicas, max_replicas)
+
+    def get_pool_stats(self):
+        return self._pool.stats()
+
+    def get_health(self):
+        health = self._pool.health()
+        return {
+            message_type: health.get(message_type, {"status": "unknown"})
+            for message_type in self.get_loaded_constraints()
+        }
+
+    def shutdown(self):
+        try:
+            logging.info("Shutting down async constraints manager...")
+            for message_type in list(self._constraints):
+                self.unload(message_type)
+            if self.metrics is not None:
+                self.metrics.remove_collector(self._collect_metrics)
+            self._pool.shutdown()
+        except Exception as e:
+            logging.error(f"Failed to shut down async constraints manager: {e}")
+            raise
+
+
+class AioConstraintsManager:
+    def __init__(self, pool_size: int = None, max_loaded_per_worker: int = 32, check_timeout: float = None, max_concurrency_per_type: int = 256, verdict_cache: VerdictCache = None, metrics: MetricsRegistry = None, max_workers: int = None):
+        self._manager = AsyncConstraintsManager(
+            pool_size, max_loaded_per_worker, verdict_cache=verdict_cache, metrics=metrics, max_workers=max_workers)
+        self.metrics = metrics
+        self._check_timeout = check_timeout
+        self._max_concurrency_per_type = max_concurrency_per_type
+        self._semaphores = {}
+
+    def _semaphore(self, message_type: str, priority: str = "normal") -> asyncio.Semaphore:
+        # separate limits per priority, so a bulk backfill cannot hold every slot
+        key = (message_type, priority)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._max_concurrency_per_type)
+            self._semaphores[key] = semaphore
+        return semaphore
+
+    async def _await_waiter(self, waiter: ConstraintOutputWaiter, timeout: float = None):
+        try:
+            return await asyncio.wait_for(waiter, timeout or self._check_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            waiter.cancel()
+            raise
+
+    def load(self, message_type: str, subject_id: str, dsl_workflow_id: str, rules=None):
+        self._manager.load(message_type, subject_id, dsl_workflow_id, rules)
+
+    def unload(self, message_type: str):
+        self._manager.unload(message_type)
+        for key in [key for key in self._semaphores if key[0] == message_type]:
+            del self._semaphores[key]
+
+    def reload(self, message_type: str, dsl_workflow_id: str = None, subject_id: str = None, rules=None) -> Future:
+        return self._manager.reload(message_type, dsl_workflow_id, subject_id, rules)
+
+    def get_loaded_constraints(self):
+        return self._manager.get_loaded_constraints()
+
+    async def check_constraint_and_convert_packet(self, message_type: str, input_data, subject_id: str, dsl_workflow_id: str, timeout: float = None, priority: str = "normal"):
+        async with self._semaphore(message_type, priority):
+            waiter = self._manager.check_constraint_and_convert_packet(
+                message_type, input_data, subject_id, dsl_workflow_id, priority)
+            return await self._await_waiter(waiter, timeout)
+
+    async def check_batch(self, message_type: str, packets: list, subject_id: str = None, dsl_workflow_id: str = None, timeout: float = None, priority: str = "normal") -> list:
+        async with self._semaphore(message_type, priority):
+            waiter = self._manager.check_batch(
+                message_type, packets, subject_id, dsl_workflow_id, priority)
+            return await self._await_waiter(waiter, timeout)
+
+    def set_scaling(self, message_type: str, min_replicas: int = 1, max_replicas: int = None):
+        self._manager.set_scaling(message_type, min_replicas, max_replicas)
+
+    async def check_chain(self, message_types: list, input_data, timeout: float = None, priority: str = "normal") -> dict:
+        async with self._semaphore(message_types[0] if message_types else None, priority):
+            waiter = self._manager.check_chain(
+                message_types, input_data, priority)
+            return await self._await_waiter(waiter, timeout)
+
+    def get_pool_stats(self):
+        return self._manager.get_pool_stats()
+
+    def get_health(self):
+        return self._manager.get_health()
+
+    def get_cache_stats(self):
+        return self._manager.get_cache_stats()
+
+    def shutdown(self):
+        self._manager.shutdown()
+        self._semaphores = {}
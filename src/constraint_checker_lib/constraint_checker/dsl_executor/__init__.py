@@ -1 +1 @@
-from .workflow_executor import new_dsl_workflow_executor, parse_dsl_output
\ No newline at end of file
+from .workflow_executor import new_dsl_workflow_executor, parse_dsl_output, prefetch_workflow
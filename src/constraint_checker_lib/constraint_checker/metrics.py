@@ -0,0 +1,164 @@
+import json
+import bisect
+import threading
+from typing import Callable, Iterable, Tuple
+
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value) -> str:
+    # the text exposition format only allows these three escapes in label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # the last slot counts observations above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        buckets[float("inf")] = self.count
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class MetricsRegistry:
+    def __init__(self, latency_buckets=DEFAULT_LATENCY_BUCKETS):
+        self.latency_buckets = latency_buckets
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(
+                    self.latency_buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, dict, float]]]):
+        # collectors are polled on every scrape and yield (name, labels, value) gauges
+        with self._lock:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def _collect_gauges(self):
+        with self._lock:
+            collectors = list(self._collectors)
+        gauges = []
+        for collector in collectors:
+            for name, labels, value in collector():
+                gauges.append((name, _label_key(labels), value))
+        return gauges
+
+    def snapshot(self):
+        gauges = self._collect_gauges()
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, histogram.snapshot())
+                          for key, histogram in self._histograms.items()]
+
+        snapshot = {"counters": {}, "gauges": {}, "histograms": {}}
+        for (name, labels), value in counters:
+            snapshot["counters"].setdefault(name, []).append(
+                {"labels": dict(labels), "value": value})
+        for name, labels, value in gauges:
+            snapshot["gauges"].setdefault(name, []).append(
+                {"labels": dict(labels), "value": value})
+        for (name, labels), histogram in histograms:
+            snapshot["histograms"].setdefault(name, []).append(
+                {"labels": dict(labels), **histogram})
+        return snapshot
+
+    def render_prometheus(self) -> str:
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in items) + "}"
+
+        snapshot = self.snapshot()
+        lines = []
+        for name, series in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {name} counter")
+            for item in series:
+                lines.append(
+                    f"{name}{fmt(item['labels'].items())} {item['value']}")
+        for name, series in sorted(snapshot["gauges"].items()):
+            lines.append(f"# TYPE {name} gauge")
+            for item in series:
+                lines.append(
+                    f"{name}{fmt(item['labels'].items())} {item['value']}")
+        for name, series in sorted(snapshot["histograms"].items()):
+            lines.append(f"# TYPE {name} histogram")
+            for item in series:
+                labels = list(item["labels"].items())
+                for bound, count in item["buckets"].items():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f"{name}_bucket{fmt(labels, [('le', le)])} {count}")
+                lines.append(f"{name}_sum{fmt(labels)} {item['sum']}")
+                lines.append(f"{name}_count{fmt(labels)} {item['count']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        snapshot = self.snapshot()
+        for series in snapshot["histograms"].values():
+            for item in series:
+                item["buckets"] = {str(bound): count for bound,
+                                   count in item["buckets"].items()}
+        with open(path, "w") as f:
+            json.dump(snapshot, f, indent=2, default=str)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
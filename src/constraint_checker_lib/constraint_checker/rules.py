@@ -0,0 +1,298 @@
+import re
+import ast
+import operator
+
+_TYPES = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, (list, tuple)),
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+_BIN_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+}
+
+_COMPARE_OPS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Is: operator.is_, ast.IsNot: operator.is_not,
+    ast.In: lambda a, b: a in b, ast.NotIn: lambda a, b: a not in b,
+}
+
+_FUNCTIONS = {
+    "len": len, "abs": abs, "min": min, "max": max, "sum": sum, "any": any, "all": all,
+    "str": str, "int": int, "float": float, "round": round, "lower": str.lower, "upper": str.upper,
+}
+
+
+# rule verdicts are keyed like a DSL output, as if the rules were one more sink module
+RULES_SINK = "rules"
+
+
+def allowed_verdict():
+    return {RULES_SINK: {"allowed": True, "reason_message": ""}}
+
+
+def rejected_verdict(reason: str):
+    return {RULES_SINK: {"allowed": False, "reason_message": reason}}
+
+
+def is_rejected(output) -> bool:
+    if isinstance(output, Exception):
+        return True
+    if not isinstance(output, dict):
+        return False
+    return any(isinstance(value, dict) and value.get("allowed") is False for value in output.values())
+
+
+def _field(value, name):
+    if isinstance(value, dict):
+        if name not in value:
+            raise KeyError(f"field '{name}' is missing")
+        return value[name]
+    raise KeyError(f"field '{name}' is not an object")
+
+
+def _compile_node(node):
+    # every node becomes a closure over the packet, so the tree is only walked once
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda packet: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        return lambda packet: _field(packet, name)
+
+    if isinstance(node, ast.Attribute):
+        target, name = _compile_node(node.value), node.attr
+        return lambda packet: _field(target(packet), name)
+
+    if isinstance(node, ast.Subscript):
+        target, index = _compile_node(node.value), _compile_node(node.slice)
+        return lambda packet: target(packet)[index(packet)]
+
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        items = [_compile_node(item) for item in node.elts]
+        return lambda packet: [item(packet) for item in items]
+
+    if isinstance(node, ast.BoolOp):
+        values = [_compile_node(value) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda packet: all(value(packet) for value in values)
+        return lambda packet: any(value(packet) for value in values)
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile_node(node.operand)
+        if isinstance(node.op, ast.Not):
+            return lambda packet: not operand(packet)
+        if isinstance(node.op, ast.USub):
+            return lambda packet: -operand(packet)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        op = _BIN_OPS[type(node.op)]
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda packet: op(left(packet), right(packet))
+
+    if isinstance(node, ast.Compare):
+        left = _compile_node(node.left)
+        steps = []
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _COMPARE_OPS:
+                break
+            steps.append((_COMPARE_OPS[type(op)], _compile_node(comparator)))
+        else:
+            def compare(packet):
+                current = left(packet)
+                for op, comparator in steps:
+                    other = comparator(packet)
+                    if not op(current, other):
+                        return False
+                    current = other
+                return True
+            return compare
+
+    if isinstance(node, ast.IfExp):
+        test, body, orelse = _compile_node(node.test), _compile_node(
+            node.body), _compile_node(node.orelse)
+        return lambda packet: body(packet) if test(packet) else orelse(packet)
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS and not node.keywords:
+        fn = _FUNCTIONS[node.func.id]
+        args = [_compile_node(arg) for arg in node.args]
+        return lambda packet: fn(*[arg(packet) for arg in args])
+
+    raise ValueError(
+        f"Unsupported expression syntax: {ast.dump(node)[:80]}")
+
+
+def compile_expression(source: str):
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid rule expression '{source}': {e}")
+    return _compile_node(tree.body)
+
+
+def _join(path: str, name) -> str:
+    if isinstance(name, int):
+        return f"{path}[{name}]"
+    return f"{path}.{name}" if path else str(name)
+
+
+def _compile_schema(schema: dict):
+    if not isinstance(schema, dict):
+        raise ValueError(f"Rule schema must be an object, got {schema!r}.")
+
+    checks = []
+
+    if "type" in schema:
+        names = schema["type"] if isinstance(
+            schema["type"], list) else [schema["type"]]
+        unknown = [name for name in names if name not in _TYPES]
+        if unknown:
+            raise ValueError(f"Unknown rule type(s): {', '.join(unknown)}.")
+        predicates = [_TYPES[name] for name in names]
+        expected = " or ".join(names)
+
+        def check_type(value, path):
+            if not any(predicate(value) for predicate in predicates):
+                return f"{path or 'packet'} must be of type {expected}"
+        checks.append(check_type)
+
+    if "const" in schema:
+        const = schema["const"]
+        checks.append(lambda value, path: None if value ==
+                      const else f"{path or 'packet'} must be {const!r}")
+
+    if "enum" in schema:
+        options = list(schema["enum"])
+        try:
+            members = frozenset(options)
+        except TypeError:
+            members = None
+
+        def check_enum(value, path):
+            try:
+                found = value in members if members is not None else value in options
+            except TypeError:
+                found = value in options
+            if not found:
+                return f"{path or 'packet'} must be one of {options}"
+        checks.append(check_enum)
+
+    for keyword, op, text in (("minimum", operator.lt, ">="), ("maximum", operator.gt, "<="),
+                              ("exclusiveMinimum", operator.le, ">"), ("exclusiveMaximum", operator.ge, "<")):
+        if keyword in schema:
+            def check_bound(value, path, bound=schema[keyword], op=op, text=text):
+                if _TYPES["number"](value) and op(value, bound):
+                    return f"{path or 'packet'} must be {text} {bound}"
+            checks.append(check_bound)
+
+    for keyword, op, text, kinds in (("minLength", operator.lt, "at least", str), ("maxLength", operator.gt, "at most", str),
+                                     ("minItems", operator.lt, "at least", (list, tuple)), ("maxItems", operator.gt, "at most", (list, tuple))):
+        if keyword in schema:
+            unit = "characters" if kinds is str else "items"
+
+            def check_size(value, path, size=schema[keyword], op=op, text=text, kinds=kinds, unit=unit):
+                if isinstance(value, kinds) and op(len(value), size):
+                    return f"{path or 'packet'} must have {text} {size} {unit}"
+            checks.append(check_size)
+
+    if "pattern" in schema:
+        try:
+            pattern = re.compile(schema["pattern"])
+        except re.error as e:
+            raise ValueError(
+                f"Invalid rule pattern '{schema['pattern']}': {e}")
+
+        def check_pattern(value, path):
+            if isinstance(value, str) and pattern.search(value) is None:
+                return f"{path or 'packet'} must match {pattern.pattern!r}"
+        checks.append(check_pattern)
+
+    required = list(schema.get("required", []))
+    properties = {name: _compile_schema(sub)
+                  for name, sub in schema.get("properties", {}).items()}
+    additional = schema.get("additionalProperties", True)
+    additional = _compile_schema(additional) if isinstance(
+        additional, dict) else additional
+    if required or properties or additional is not True:
+        def check_object(value, path):
+            if not isinstance(value, dict):
+                return None
+            for name in required:
+                if name not in value:
+                    return f"{_join(path, name)} is required"
+            for name, item in value.items():
+                check = properties.get(name)
+                if check is None:
+                    if additional is False:
+                        return f"{_join(path, name)} is not allowed"
+                    if additional is True:
+                        continue
+                    check = additional
+                reason = check(item, _join(path, name))
+                if reason is not None:
+                    return reason
+        checks.append(check_object)
+
+    if "items" in schema:
+        item_check = _compile_schema(schema["items"])
+
+        def check_items(value, path):
+            if not isinstance(value, (list, tuple)):
+                return None
+            for index, item in enumerate(value):
+                reason = item_check(item, _join(path, index))
+                if reason is not None:
+                    return reason
+        checks.append(check_items)
+
+    for rule in schema.get("expressions", []):
+        if isinstance(rule, str):
+            rule = {"expr": rule}
+        source = rule["expr"]
+        evaluate = compile_expression(source)
+
+        def check_expression(value, path, evaluate=evaluate, source=source, message=rule.get("message")):
+            try:
+                passed = evaluate(value)
+            except Exception as e:
+                return message or f"{path + ': ' if path else ''}'{source}' could not be evaluated: {str(e).strip(chr(34) + chr(39))}"
+            if not passed:
+                return message or f"{path + ': ' if path else ''}'{source}' is not satisfied"
+        checks.append(check_expression)
+
+    def check(value, path):
+        for check_one in checks:
+            reason = check_one(value, path)
+            if reason is not None:
+                return reason
+        return None
+    return check
+
+
+class RuleSet:
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self._check = _compile_schema(spec)
+
+    def first_error(self, packet):
+        # the reason the packet is rejected, or None when every rule passes
+        return self._check(packet, "")
+
+    def verdict(self, packet):
+        reason = self.first_error(packet)
+        return allowed_verdict() if reason is None else rejected_verdict(reason)
+
+
+def compile_rules(spec) -> RuleSet:
+    if spec is None or isinstance(spec, RuleSet):
+        return spec
+    return RuleSet(spec)
@@ -0,0 +1,119 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+SHM_THRESHOLD = int(os.getenv("CONSTRAINT_SHM_THRESHOLD", str(64 * 1024)))
+SHM_POOL_BYTES = int(os.getenv("CONSTRAINT_SHM_POOL_BYTES",
+                               str(128 * 1024 * 1024)))
+
+
+class InlinePayload:
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+class SharedPayload:
+    __slots__ = ("name", "size")
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+
+
+def _destroy(segment: shared_memory.SharedMemory):
+    try:
+        segment.close()
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class SegmentPool:
+    # creating and faulting in a fresh segment costs far more than copying into a warm one
+    def __init__(self, max_retained_bytes: int = SHM_POOL_BYTES):
+        self.max_retained_bytes = max_retained_bytes
+        self._free = {}
+        self._retained = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int) -> shared_memory.SharedMemory:
+        capacity = 1 << max(size - 1, 1).bit_length()
+        with self._lock:
+            free = self._free.get(capacity)
+            if free:
+                self._retained -= capacity
+                return free.pop()
+        return shared_memory.SharedMemory(create=True, size=capacity)
+
+    def release(self, segment: shared_memory.SharedMemory):
+        with self._lock:
+            if self._retained + segment.size <= self.max_retained_bytes:
+                self._free.setdefault(segment.size, []).append(segment)
+                self._retained += segment.size
+                return
+        _destroy(segment)
+
+    def close(self):
+        with self._lock:
+            segments = [segment for free in self._free.values()
+                        for segment in free]
+            self._free = {}
+            self._retained = 0
+        for segment in segments:
+            _destroy(segment)
+
+
+class SegmentReader:
+    def __init__(self, max_attached: int = 16):
+        self.max_attached = max_attached
+        self._attached = OrderedDict()
+
+    def read(self, payload: SharedPayload):
+        segment = self._attached.get(payload.name)
+        if segment is None:
+            segment = shared_memory.SharedMemory(name=payload.name)
+            self._attached[payload.name] = segment
+            while len(self._attached) > self.max_attached:
+                self._attached.popitem(last=False)[1].close()
+        else:
+            self._attached.move_to_end(payload.name)
+
+        view = segment.buf[:payload.size]
+        try:
+            return pickle.loads(view)
+        finally:
+            view.release()
+
+    def close(self):
+        for segment in self._attached.values():
+            segment.close()
+        self._attached.clear()
+
+
+def encode_payload(value, threshold: int, pool: SegmentPool):
+    # returns the descriptor to send and the segment to hand back to the pool once it has been read
+    if not threshold:
+        return value, None
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) < threshold:
+        return InlinePayload(data), None
+
+    segment = pool.acquire(len(data))
+    try:
+        segment.buf[:len(data)] = data
+    except Exception:
+        pool.release(segment)
+        raise
+    return SharedPayload(segment.name, len(data)), segment
+
+
+def decode_payload(payload, reader: SegmentReader):
+    if isinstance(payload, InlinePayload):
+        return pickle.loads(payload.data)
+    if isinstance(payload, SharedPayload):
+        return reader.read(payload)
+    return payload
@@ -0,0 +1,83 @@
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+def input_digest(input_data) -> Optional[str]:
+    try:
+        canonical = json.dumps(input_data, sort_keys=True,
+                               separators=(",", ":"), ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def make_key(self, message_type: str, version: str, input_data) -> Optional[Tuple[str, str, str]]:
+        digest = input_digest(input_data)
+        if digest is None:
+            return None
+        return (message_type, version, digest)
+
+    def get(self, key) -> Tuple[bool, Any]:
+        if key is None:
+            return False, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl and time.monotonic() - entry[0] > self.ttl):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[1]
+        return True, copy.deepcopy(value)
+
+    def put(self, key, value):
+        if key is None:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, message_type: str):
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == message_type]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
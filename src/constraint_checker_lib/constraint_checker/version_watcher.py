@@ -0,0 +1,83 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+
+from .dsl_executor.workflow_executor import fetch_workflow
+
+
+def workflow_fingerprint(workflow: dict) -> str:
+    if workflow.get("version") is not None:
+        return str(workflow["version"])
+    canonical = json.dumps(workflow, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ConstraintVersionWatcher:
+    def __init__(self, manager, interval: float = 30.0, workflows_base_uri: str = None):
+        self.manager = manager
+        self.interval = interval
+        self.workflows_base_uri = workflows_base_uri or os.getenv("DSL_DB_URL")
+        # message_type -> (dsl_workflow_id, fingerprint) last seen
+        self._seen = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="constraint-version-watcher", daemon=True)
+        self._thread.start()
+        logging.info(
+            f"Constraint version watcher started, polling every {self.interval}s.")
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def poll_once(self) -> list:
+        reloaded = []
+        loaded = self.manager.get_loaded_constraints()
+        for message_type in list(self._seen):
+            if message_type not in loaded:
+                del self._seen[message_type]
+
+        for message_type, (_, dsl_workflow_id) in loaded.items():
+            if dsl_workflow_id is None:
+                continue
+            workflow = fetch_workflow(
+                dsl_workflow_id, self.workflows_base_uri, use_cache=False)
+            if not isinstance(workflow, dict) or workflow.get("success") is False:
+                logging.warning(
+                    f"Could not fetch workflow {dsl_workflow_id} for message type '{message_type}': {workflow}")
+                continue
+
+            fingerprint = workflow_fingerprint(workflow)
+            seen = self._seen.get(message_type)
+            self._seen[message_type] = (dsl_workflow_id, fingerprint)
+            # the first sighting of a workflow only records its baseline
+            if seen is None or seen[0] != dsl_workflow_id or seen[1] == fingerprint:
+                continue
+
+            logging.info(
+                f"Workflow {dsl_workflow_id} changed, reloading constraint for message type '{message_type}'.")
+            try:
+                self.manager.reload(message_type)
+                reloaded.append(message_type)
+            except Exception as e:
+                logging.error(
+                    f"Failed to start reload for message type '{message_type}': {e}")
+        return reloaded
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logging.error(f"Constraint version watcher poll failed: {e}")
+            self._stop.wait(self.interval)
@@ -0,0 +1,946 @@
+import os
+import time
+import pickle
+import logging
+import itertools
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from multiprocessing import Process, Queue, Pipe, resource_tracker
+from multiprocessing.connection import Connection, wait
+
+from .shared_payload import SHM_THRESHOLD, SegmentPool, SegmentReader, SharedPayload, encode_payload, decode_payload
+from .rules import is_rejected
+
+
+# share of the workers each priority lane gets while lanes compete
+DEFAULT_LANE_WEIGHTS = {"high": 16, "normal": 4, "low": 1}
+
+
+class ConstraintWorkerError(RuntimeError):
+    pass
+
+
+def _picklable_error(e: Exception) -> Exception:
+    try:
+        pickle.dumps(e)
+        return e
+    except Exception:
+        return RuntimeError(f"{type(e).__name__}: {e}")
+
+
+def _run_worker(worker_id: int, input_queue: Queue, result_conn: Connection, cancel_conn: Connection, max_loaded: int, shm_threshold: int):
+    from .dsl_executor import new_dsl_workflow_executor, parse_dsl_output
+
+    # (message_type, version) -> dsl, least recently used first
+    loaded = OrderedDict()
+    cancelled = set()
+    reader = SegmentReader()
+    segments = SegmentPool()
+    # result segments the parent has not handed back yet
+    lent = {}
+
+    def evict(key):
+        dsl = loaded.pop(key)
+        try:
+            dsl.clean_up()
+        except Exception as e:
+            logging.warning(
+                f"Worker {worker_id} failed to clean up constraint for message type '{key[0]}': {e}")
+
+    def get_dsl(message_type, dsl_workflow_id, version):
+        key = (message_type, version)
+        dsl = loaded.get(key)
+        if dsl is not None:
+            loaded.move_to_end(key)
+            return dsl
+
+        # always fetch the current definition, a reload may have just published it
+        dsl = new_dsl_workflow_executor(
+            dsl_workflow_id, os.getenv("DSL_DB_URL"), use_cache=False)
+        dsl.prepare()
+        loaded[key] = dsl
+        while len(loaded) > max_loaded:
+            evict(next(iter(loaded)))
+        return dsl
+
+    def reply(request_id, status, value):
+        try:
+            value, segment = encode_payload(value, shm_threshold, segments)
+        except Exception as e:
+            result_conn.send((request_id, "error", _picklable_error(e)))
+            return
+        if segment is not None:
+            lent[segment.name] = segment
+        result_conn.send((request_id, status, value))
+
+    def drain_control():
+        # request ids are cancellations, names are result segments the parent has read
+        while cancel_conn.poll():
+            item = cancel_conn.recv()
+            if isinstance(item, str):
+                if item in lent:
+                    segments.release(lent.pop(item))
+            else:
+                cancelled.add(item)
+
+    def handle(message):
+        kind = message[0]
+        if kind == "unload":
+            _, message_type, version = message
+            for key in [key for key in loaded if key[0] == message_type]:
+                if version is None or key[1] == version:
+                    evict(key)
+            return
+
+        _, request_id, message_type, dsl_workflow_id, version, payload = message
+
+        drain_control()
+        if request_id in cancelled:
+            cancelled.discard(request_id)
+            reply(request_id, "cancelled", None)
+            return
+
+        try:
+            payload = decode_payload(payload, reader)
+        except Exception as e:
+            reply(request_id, "error", _picklable_error(e))
+            return
+
+        if kind == "chain":
+            # dsl_workflow_id holds the (message_type, dsl_workflow_id, version) stages
+            outputs = []
+            # indexes of the stages now loaded here, the parent mirrors only those
+            stages_loaded = []
+            for index, (stage_type, stage_workflow_id, stage_version) in enumerate(dsl_workflow_id):
+                try:
+                    dsl = get_dsl(stage_type, stage_workflow_id, stage_version)
+                    stages_loaded.append(index)
+                    output = parse_dsl_output(dsl.execute(payload), "")
+                except Exception as e:
+                    output = _picklable_error(e)
+                outputs.append(output)
+                if is_rejected(output):
+                    break
+            reply(request_id, "ok", (outputs, stages_loaded))
+            return
+
+        try:
+            dsl = get_dsl(message_type, dsl_workflow_id, version)
+        except Exception as e:
+            logging.error(
+                f"Worker {worker_id} failed to load constraint for message type '{message_type}': {e}")
+            error = _picklable_error(e)
+            reply(request_id, "load_error",
+                  [error] * len(payload) if kind == "batch" else error)
+            return
+
+        if kind == "load":
+            reply(request_id, "ok", True)
+            return
+
+        if kind == "batch":
+            outputs = []
+            for input_data in payload:
+                try:
+                    outputs.append(parse_dsl_output(
+                        dsl.execute(input_data), ""))
+                except Exception as e:
+                    outputs.append(_picklable_error(e))
+            reply(request_id, "ok", outputs)
+            return
+
+        try:
+            reply(request_id, "ok", parse_dsl_output(dsl.execute(payload), ""))
+        except Exception as e:
+            reply(request_id, "error", _picklable_error(e))
+
+    while True:
+        message = input_queue.get()
+        if message is None:
+            break
+        # messages handed out together arrive as one list
+        if isinstance(message, list):
+            for item in message:
+                handle(item)
+        else:
+            handle(message)
+
+    reader.close()
+    for segment in lent.values():
+        segments.release(segment)
+    segments.close()
+
+
+class _PendingRequest:
+    __slots__ = ("future", "worker", "weight", "kind", "message_type",
+                 "key", "message", "priority", "enqueued_at", "segment")
+
+    def __init__(self, future: Future, weight: int, kind: str, key: tuple, message: tuple, priority: str = "normal", segment=None):
+        self.future = future
+        # None while the request waits in the pool's backlog
+        self.worker = None
+        self.weight = weight
+        self.kind = kind
+        self.message_type = key[0]
+        self.key = key
+        self.message = message
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        # shared memory holding the request payload, owned by the parent until the reply
+        self.segment = segment
+
+
+class _TypeHealth:
+    __slots__ = ("consecutive_failures", "total_failures",
+                 "last_error", "last_failure", "last_success")
+
+    def __init__(self):
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.last_error = None
+        self.last_failure = None
+        self.last_success = None
+
+
+class _WorkerHandle:
+    def __init__(self, worker_id: int, max_loaded: int, shm_threshold: int, restarts: int = 0):
+        self.worker_id = worker_id
+        self.restarts = restarts
+        self.input_queue = Queue()
+        self.result_reader, result_writer = Pipe(duplex=False)
+        cancel_reader, self.cancel_writer = Pipe(duplex=False)
+        # mirrors the worker's (message_type, version) LRU so routing knows where a constraint is warm,
+        # values are the dsl_workflow_id so a respawned worker can be warmed again
+        self.loaded = OrderedDict()
+        # packets sent and not yet answered, and the number of messages they came in
+        self.outstanding = 0
+        self.in_flight = 0
+        self.alive = True
+        self.started_at = time.monotonic()
+        self.last_progress = self.started_at
+        self.process = Process(
+            target=_run_worker,
+            args=(worker_id, self.input_queue, result_writer,
+                  cancel_reader, max_loaded, shm_threshold),
+            daemon=True
+        )
+        self.process.start()
+        # drop the parent's copies so a dead worker shows up as EOF
+        result_writer.close()
+        cancel_reader.close()
+
+
+class ConstraintWorkerPool:
+    def __init__(self, pool_size: int = None, max_loaded_per_worker: int = 32, spill_threshold: int = 4,
+                 hang_timeout: float = None, respawn_backoff: float = 0.5, max_respawn_backoff: float = 30.0,
+                 liveness_interval: float = 1.0, failure_threshold: int = 3, shm_threshold: int = SHM_THRESHOLD,
+                 max_workers: int = None, scale_up_depth: int = None, scale_up_wait: float = 0.5, idle_timeout: float = 30.0,
+                 window: int = None, lane_weights: dict = None):
+        self.pool_size = pool_size or int(
+            os.getenv("CONSTRAINT_POOL_SIZE", "0")) or os.cpu_count() or 1
+        # the pool grows past pool_size up to max_workers under load and shrinks back when idle
+        self.max_workers = max(self.pool_size, max_workers or int(
+            os.getenv("CONSTRAINT_MAX_WORKERS", "0")) or self.pool_size)
+        self.scale_up_depth = scale_up_depth or spill_threshold
+        self.scale_up_wait = scale_up_wait
+        self.idle_timeout = idle_timeout
+        self.max_loaded_per_worker = max_loaded_per_worker
+        self.spill_threshold = spill_threshold
+        # checks stay in the pool's backlog until a worker has fewer than this many in flight,
+        # so added replicas can take over queued work
+        self.window = window or int(os.getenv("CONSTRAINT_WORKER_WINDOW", "4"))
+        # a worker with outstanding work and no reply for this long is killed and respawned
+        self.hang_timeout = hang_timeout or float(
+            os.getenv("CONSTRAINT_WORKER_HANG_TIMEOUT", "0")) or None
+        self.respawn_backoff = respawn_backoff
+        self.max_respawn_backoff = max_respawn_backoff
+        self.liveness_interval = liveness_interval
+        self.failure_threshold = failure_threshold
+        # payloads and results at least this many pickled bytes go through shared memory, 0 disables it
+        self.shm_threshold = shm_threshold
+        self._segments = SegmentPool()
+        self._reader = SegmentReader()
+        if shm_threshold:
+            # workers have to share the parent's tracker, or each would unlink segments on exit
+            resource_tracker.ensure_running()
+        self._pending = {}
+        # priority lanes, highest first, share the workers in proportion to their weights
+        self.lane_weights = dict(lane_weights or DEFAULT_LANE_WEIGHTS)
+        self._lanes = sorted(self.lane_weights,
+                             key=lambda lane: -self.lane_weights[lane])
+        self._lane_credit = dict.fromkeys(self._lanes, 0)
+        # lane -> (message_type, version) -> request ids waiting for a worker, oldest first
+        self._backlog = {lane: OrderedDict() for lane in self._lanes}
+        self._deferred_unloads = set()
+        self._health = {}
+        self._request_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stopped = threading.Event()
+        self._wake_lock = threading.Lock()
+        self._wake_reader, self._wake_writer = Pipe(duplex=False)
+        # worker_id -> respawn deadline, and consecutive crashes per worker slot
+        self._respawns = {}
+        self._crashes = {}
+        self._retired = []
+        # message_type -> (min_replicas, max_replicas)
+        self._scaling = {}
+        self._worker_ids = itertools.count()
+        self._workers = {}
+        for _ in range(self.pool_size):
+            worker = _WorkerHandle(
+                next(self._worker_ids), max_loaded_per_worker, shm_threshold)
+            self._workers[worker.worker_id] = worker
+        self._collector = threading.Thread(
+            target=self._collect_results, daemon=True)
+        self._collector.start()
+        self._supervisor = threading.Thread(
+            target=self._supervise, daemon=True)
+        self._supervisor.start()
+        logging.info(
+            f"Constraint worker pool started with {self.pool_size} workers.")
+
+    def _alive_workers(self):
+        return [w for w in self._workers.values() if w.alive]
+
+    def _replica_limits(self, message_type: str):
+        return self._scaling.get(message_type, (1, self.max_workers))
+
+    def set_scaling(self, message_type: str, min_replicas: int = 1, max_replicas: int = None):
+        min_replicas = max(1, min_replicas)
+        max_replicas = max(min_replicas, max_replicas or self.max_workers)
+        with self._lock:
+            self._scaling[message_type] = (min_replicas, max_replicas)
+
+    def _select_worker(self, key: tuple) -> _WorkerHandle:
+        workers = self._alive_workers()
+        if not workers:
+            raise ConstraintWorkerError("No constraint workers are alive.")
+
+        warm = [w for w in workers if key in w.loaded]
+        if warm:
+            return min(warm, key=lambda w: w.outstanding)
+        return min(workers, key=lambda w: (w.outstanding, len(w.loaded)))
+
+    def _select_open_worker(self, key: tuple, backlog: int, window: int):
+        # runs for every handed out check, so a single pass over the workers
+        warm = 0
+        best_warm = None
+        idle = None
+        for w in self._workers.values():
+            if not w.alive or w.in_flight >= window:
+                if w.alive and key in w.loaded:
+                    warm += 1
+                continue
+            if key in w.loaded:
+                warm += 1
+                if best_warm is None or w.outstanding < best_warm.outstanding:
+                    best_warm = w
+            elif idle is None or (w.outstanding, len(w.loaded)) < (idle.outstanding, len(idle.loaded)):
+                idle = w
+
+        # spill onto an idle worker only when the warm ones are backed up
+        if idle is not None and (best_warm is None or best_warm.in_flight > 0):
+            if not warm or (idle.outstanding == 0 and backlog >= self.spill_threshold
+                            and warm < self._replica_limits(key[0])[1]):
+                return idle
+        return best_warm
+
+    def _touch(self, worker: _WorkerHandle, key: tuple, dsl_workflow_id: str):
+        if key in worker.loaded:
+            worker.loaded.move_to_end(key)
+            return
+        worker.loaded[key] = dsl_workflow_id
+        while len(worker.loaded) > self.max_loaded_per_worker:
+            worker.loaded.popitem(last=False)
+
+    def _new_request(self, kind: str, message_type: str, dsl_workflow_id: str, version: str, payload, weight: int, priority: str = "normal", segment=None):
+        request_id = next(self._request_ids)
+        message = (kind, request_id, message_type,
+                   dsl_workflow_id, version, payload)
+        pending = _PendingRequest(
+            Future(), weight, kind, (message_type, version), message, priority, segment)
+        self._pending[request_id] = pending
+        return request_id, pending
+
+    def _send(self, worker: _WorkerHandle, pending: _PendingRequest, outbox: dict = None):
+        # a chain may stop before its later stages, they are mirrored once the worker replies
+        if pending.kind != "chain":
+            self._touch(worker, pending.key, pending.message[3])
+        pending.worker = worker
+        if worker.in_flight == 0:
+            worker.last_progress = time.monotonic()
+        worker.outstanding += pending.weight
+        worker.in_flight += 1
+        if outbox is None:
+            worker.input_queue.put(pending.message)
+        else:
+            outbox.setdefault(worker, []).append(pending.message)
+
+    def _enqueue(self, worker: _WorkerHandle, kind: str, message_type: str, dsl_workflow_id: str, version: str, payload, weight: int):
+        # loads go straight to their worker, they are what makes it a replica
+        request_id, pending = self._new_request(
+            kind, message_type, dsl_workflow_id, version, payload, weight)
+        self._send(worker, pending)
+        return request_id, pending.future
+
+    def _backlog_depth(self, key: tuple) -> int:
+        return sum(len(self._backlog[lane].get(key, ())) for lane in self._lanes)
+
+    def _pump_lane(self, lane: str, outbox: dict) -> bool:
+        # hands out one request of the lane, rotating through its constraints
+        queues = self._backlog[lane]
+        # the top lane may use one slot past the window so it never waits behind a full one
+        window = self.window + 1 if lane == self._lanes[0] else self.window
+        for key, queue in queues.items():
+            worker = self._select_open_worker(
+                key, self._backlog_depth(key), window)
+            if worker is None:
+                continue
+            pending = self._pending.get(queue.popleft())
+            if queue:
+                queues.move_to_end(key)
+            else:
+                del queues[key]
+                if key in self._deferred_unloads and not self._backlog_depth(key):
+                    self._deferred_unloads.discard(key)
+                    self._send_unload(key, outbox)
+            if pending is not None:
+                self._send(worker, pending, outbox)
+            return True
+        return False
+
+    def _pump(self):
+        # hand backlogged requests to workers with free slots, picking lanes by smooth weighted
+        # round robin; each worker gets what it was handed as a single queue item
+        outbox = {}
+        credit = self._lane_credit
+        while True:
+            lanes = [lane for lane in self._lanes if self._backlog[lane]]
+            if not lanes:
+                break
+            total = 0
+            for lane in lanes:
+                credit[lane] += self.lane_weights[lane]
+                total += self.lane_weights[lane]
+            for lane in sorted(lanes, key=lambda lane: -credit[lane]):
+                if self._pump_lane(lane, outbox):
+                    credit[lane] -= total
+                    break
+            else:
+                for lane in lanes:
+                    credit[lane] -= self.lane_weights[lane]
+                break
+        for lane in self._lanes:
+            if not self._backlog[lane]:
+                credit[lane] = 0
+
+        for worker, messages in outbox.items():
+            worker.input_queue.put(
+                messages[0] if len(messages) == 1 else messages)
+
+    def _dispatch(self, kind: str, message_type: str, dsl_workflow_id: str, version: str, payload, weight: int, priority: str = "normal"):
+        version = version or dsl_workflow_id
+        if priority not in self.lane_weights:
+            raise ValueError(
+                f"Unknown priority '{priority}', expected one of {', '.join(self._lanes)}.")
+        if kind == "load":
+            with self._lock:
+                return self._enqueue(self._select_worker((message_type, version)), kind,
+                                     message_type, dsl_workflow_id, version, payload, weight)
+
+        # serialize outside the lock, large payloads are the expensive part
+        payload, segment = encode_payload(
+            payload, self.shm_threshold, self._segments)
+        try:
+            with self._lock:
+                if not self._alive_workers():
+                    raise ConstraintWorkerError(
+                        "No constraint workers are alive.")
+                request_id, pending = self._new_request(
+                    kind, message_type, dsl_workflow_id, version, payload, weight, priority, segment)
+                queues = self._backlog[priority]
+                queue = queues.get(pending.key)
+                if queue is None:
+                    queue = queues[pending.key] = deque()
+                queue.append(request_id)
+                self._pump()
+                return request_id, pending.future
+        except Exception:
+            if segment is not None:
+                self._segments.release(segment)
+            raise
+
+    def warm(self, message_type: str, dsl_workflow_id: str, version: str = None):
+        return self._dispatch("load", message_type, dsl_workflow_id, version, None, 1)
+
+    def submit(self, message_type: str, dsl_workflow_id: str, input_data, version: str = None, priority: str = "normal"):
+        return self._dispatch("check", message_type, dsl_workflow_id, version, input_data, 1, priority)
+
+    def submit_batch(self, message_type: str, dsl_workflow_id: str, packets: list, version: str = None, priority: str = "normal"):
+        return self._dispatch("batch", message_type, dsl_workflow_id, version, packets, max(1, len(packets)), priority)
+
+    def submit_chain(self, stages: list, input_data, priority: str = "normal"):
+        # stages are (message_type, dsl_workflow_id, version), run in order by one worker
+        # until the first rejection; routed to where the first stage is warm
+        stages = tuple((message_type, dsl_workflow_id, version or dsl_workflow_id)
+                       for message_type, dsl_workflow_id, version in stages)
+        if not stages:
+            raise ValueError("A constraint chain needs at least one stage.")
+        message_type, _, version = stages[0]
+        return self._dispatch("chain", message_type, stages, version, input_data, len(stages), priority)
+
+    def cancel(self, request_id: int) -> bool:
+        with self._lock:
+            pending = self._pending.get(request_id)
+            if pending is None:
+                return False
+            pending.future.cancel()
+            if not pending.future.cancelled():
+                return False
+            if pending.worker is None:
+                queues = self._backlog[pending.priority]
+                queues[pending.key].remove(request_id)
+                if not queues[pending.key]:
+                    del queues[pending.key]
+                self._release(request_id)
+                return True
+            # the worker skips it if it has not started; the entry is released on its reply
+            try:
+                pending.worker.cancel_writer.send(request_id)
+            except OSError:
+                pass
+            return True
+
+    def _send_unload(self, key: tuple, outbox: dict = None):
+        for worker in self._workers.values():
+            if key in worker.loaded:
+                del worker.loaded[key]
+                if outbox is None:
+                    worker.input_queue.put(("unload", key[0], key[1]))
+                else:
+                    outbox.setdefault(worker, []).append(
+                        ("unload", key[0], key[1]))
+
+    def unload(self, message_type: str, version: str = None):
+        # queued behind any in-flight work, so each worker drains the old version first;
+        # versions with a backlog are unloaded once it has been handed out
+        with self._lock:
+            keys = {key for worker in self._workers.values() for key in worker.loaded}
+            for queues in self._backlog.values():
+                keys.update(queues)
+            for key in keys:
+                if key[0] != message_type or (version is not None and key[1] != version):
+                    continue
+                if self._backlog_depth(key):
+                    self._deferred_unloads.add(key)
+                else:
+                    self._send_unload(key)
+
+    def _record_health(self, message_type: str, error: Exception = None):
+        health = self._health.get(message_type)
+        if health is None:
+            health = self._health[message_type] = _TypeHealth()
+        now = time.time()
+        if error is None:
+            health.consecutive_failures = 0
+            health.last_success = now
+            return
+        health.consecutive_failures += 1
+        health.total_failures += 1
+        health.last_error = str(error)
+        health.last_failure = now
+
+    def _release(self, request_id: int) -> _PendingRequest:
+        pending = self._pending.pop(request_id)
+        if pending.worker is not None:
+            pending.worker.outstanding -= pending.weight
+            pending.worker.in_flight -= 1
+            pending.worker.last_progress = time.monotonic()
+        if pending.segment is not None:
+            self._segments.release(pending.segment)
+        return pending
+
+    def _complete(self, request_id: int, status: str, value):
+        self._complete_many([(request_id, status, value)])
+
+    def _complete_many(self, results: list):
+        done = []
+        with self._lock:
+            for request_id, status, value in results:
+                if request_id not in self._pending:
+                    continue
+                pending = self._release(request_id)
+                if pending.kind == "chain" and status == "ok":
+                    value, stages_loaded = value
+                    stages = pending.message[3]
+                    for index in stages_loaded:
+                        message_type, dsl_workflow_id, version = stages[index]
+                        self._touch(pending.worker,
+                                    (message_type, version), dsl_workflow_id)
+                done.append((pending, status, value))
+                # check errors raised by the DSL itself say nothing about the worker's health,
+                # and a successful warm-up does not prove the checks stopped crashing
+                if status in ("ok", "error") and pending.kind != "load":
+                    self._record_health(pending.message_type)
+                elif status == "load_error":
+                    self._record_health(pending.message_type,
+                                        value[0] if isinstance(value, list) else value)
+                elif isinstance(value, ConstraintWorkerError):
+                    self._record_health(pending.message_type, value)
+            # refill the freed slots before waking anyone up
+            if any(self._backlog.values()):
+                self._pump()
+
+        for pending, status, value in done:
+            if not pending.future.set_running_or_notify_cancel():
+                continue
+            if status == "ok" or (status == "load_error" and isinstance(value, list)):
+                pending.future.set_result(value)
+            else:
+                pending.future.set_exception(value)
+
+    def _fail_worker(self, worker: _WorkerHandle, error: Exception):
+        with self._lock:
+            if not worker.alive:
+                return
+            worker.alive = False
+            failed = [request_id for request_id, pending in self._pending.items()
+                      if pending.worker is worker]
+            if self._closed:
+                pass
+            elif len(self._workers) > self.pool_size:
+                # a scaled-out worker is not replaced, the autoscaler adds one back if needed
+                self._discard(worker)
+            else:
+                self._schedule_respawn(worker)
+        for request_id in failed:
+            self._complete(request_id, "crashed", error)
+
+    def _schedule_respawn(self, worker: _WorkerHandle):
+        # back off exponentially while a slot keeps crashing, reset once it stays up
+        crashes = self._crashes.get(worker.worker_id, 0)
+        if time.monotonic() - worker.started_at > self.max_respawn_backoff * 2:
+            crashes = 0
+        crashes += 1
+        self._crashes[worker.worker_id] = crashes
+        delay = min(self.max_respawn_backoff,
+                    self.respawn_backoff * 2 ** (crashes - 1))
+        self._respawns[worker.worker_id] = time.monotonic() + delay
+        logging.warning(
+            f"Respawning constraint worker {worker.worker_id} in {delay:.1f}s (crash #{crashes}).")
+
+    def _respawn(self, worker_id: int):
+        with self._lock:
+            previous = self._workers[worker_id]
+            warm = list(previous.loaded.items())
+
+        worker = _WorkerHandle(
+            worker_id, self.max_loaded_per_worker, self.shm_threshold, previous.restarts + 1)
+        previous.process.join(0)
+
+        with self._lock:
+            if self._closed:
+                worker.input_queue.put(None)
+                return
+            self._discard(previous)
+            self._workers[worker_id] = worker
+            for (message_type, version), dsl_workflow_id in warm:
+                self._enqueue(worker, "load", message_type,
+                              dsl_workflow_id, version, None, 1)
+            self._pump()
+        self._wake()
+        logging.info(
+            f"Constraint worker {worker_id} respawned with pid {worker.process.pid}.")
+
+    def _discard(self, worker: _WorkerHandle):
+        # replaced workers stay with the collector until their pipe reports EOF
+        self._workers.pop(worker.worker_id, None)
+        if not worker.result_reader.closed:
+            self._retired.append(worker)
+        worker.input_queue.cancel_join_thread()
+        worker.input_queue.close()
+        worker.cancel_writer.close()
+
+    def _spawn_worker(self):
+        worker = _WorkerHandle(next(self._worker_ids),
+                               self.max_loaded_per_worker, self.shm_threshold)
+        with self._lock:
+            if self._closed or len(self._workers) >= self.max_workers:
+                worker.input_queue.put(None)
+                return None
+            self._workers[worker.worker_id] = worker
+        self._wake()
+        logging.info(
+            f"Constraint worker {worker.worker_id} started with pid {worker.process.pid}, pool has {len(self._workers)} workers.")
+        return worker
+
+    def _add_replica(self, key: tuple):
+        with self._lock:
+            dsl_workflow_id = next((w.loaded[key] for w in self._workers.values()
+                                    if key in w.loaded), None)
+            if dsl_workflow_id is None:
+                return
+            idle = [w for w in self._alive_workers()
+                    if key not in w.loaded and w.outstanding == 0]
+            target = min(idle, key=lambda w: len(w.loaded)) if idle else None
+            spawn = target is None and len(self._workers) < self.max_workers
+
+        if spawn:
+            target = self._spawn_worker()
+        if target is None:
+            return
+
+        with self._lock:
+            if not target.alive or key in target.loaded:
+                return
+            # dependencies and archives come from the shared artifact cache, so warm-up is cheap
+            self._enqueue(target, "load", key[0],
+                          dsl_workflow_id, key[1], None, 1)
+            # the backlog starts flowing to the new replica right behind its load
+            self._pump()
+        logging.info(
+            f"Scaled out message type '{key[0]}' onto constraint worker {target.worker_id}.")
+
+    def _autoscale(self):
+        now = time.monotonic()
+        scale_out = []
+        with self._lock:
+            if self._closed:
+                return
+            workers = self._alive_workers()
+
+            # checks waiting for a worker, and how long the oldest has waited
+            demand = {}
+            for queues in self._backlog.values():
+                for key, queue in queues.items():
+                    oldest = self._pending.get(queue[0])
+                    depth, since = demand.get(key, (0, now))
+                    demand[key] = (depth + len(queue),
+                                   min(since, oldest.enqueued_at if oldest else now))
+
+            replicas = {}
+            for worker in workers:
+                for key in worker.loaded:
+                    replicas[key] = replicas.get(key, 0) + 1
+
+            for key, count in replicas.items():
+                min_replicas, max_replicas = self._replica_limits(key[0])
+                if count < min_replicas:
+                    scale_out.append(key)
+                    continue
+                if key not in demand or count >= max_replicas:
+                    continue
+                depth, oldest = demand[key]
+                if depth / count > self.scale_up_depth or now - oldest > self.scale_up_wait:
+                    scale_out.append(key)
+
+            retire = []
+            surplus = len(self._workers) - self.pool_size
+            for worker in sorted(workers, key=lambda w: w.last_progress):
+                if surplus <= 0:
+                    break
+                if worker.outstanding or now - worker.last_progress < self.idle_timeout:
+                    continue
+                if any(key[0] in self._scaling and replicas[key] <= self._scaling[key[0]][0]
+                       for key in worker.loaded):
+                    continue
+                for key in worker.loaded:
+                    replicas[key] -= 1
+                worker.alive = False
+                self._workers.pop(worker.worker_id)
+                self._retired.append(worker)
+                retire.append(worker)
+                surplus -= 1
+
+        for worker in retire:
+            worker.input_queue.put(None)
+            logging.info(
+                f"Retired idle constraint worker {worker.worker_id}, pool has {len(self._workers)} workers.")
+        for key in scale_out:
+            self._add_replica(key)
+
+    def _wake(self):
+        with self._wake_lock:
+            self._wake_writer.send(None)
+
+    def _supervise(self):
+        while not self._stopped.wait(self.liveness_interval):
+            now = time.monotonic()
+            with self._lock:
+                workers = self._alive_workers()
+                due = [worker_id for worker_id, at in self._respawns.items()
+                       if at <= now]
+                for worker_id in due:
+                    del self._respawns[worker_id]
+
+            for worker in workers:
+                if not worker.process.is_alive():
+                    logging.error(
+                        f"Constraint worker {worker.worker_id} is no longer running.")
+                    self._fail_worker(worker, ConstraintWorkerError(
+                        f"Constraint worker {worker.worker_id} exited unexpectedly."))
+                elif self.hang_timeout and worker.outstanding and now - worker.last_progress > self.hang_timeout:
+                    logging.error(
+                        f"Constraint worker {worker.worker_id} made no progress for {self.hang_timeout}s, killing it.")
+                    worker.process.kill()
+                    self._fail_worker(worker, ConstraintWorkerError(
+                        f"Constraint worker {worker.worker_id} was killed after hanging for {self.hang_timeout}s."))
+
+            for worker_id in due:
+                try:
+                    self._respawn(worker_id)
+                except Exception as e:
+                    logging.error(
+                        f"Failed to respawn constraint worker {worker_id}: {e}")
+                    with self._lock:
+                        self._respawns[worker_id] = time.monotonic() + \
+                            self.max_respawn_backoff
+
+            try:
+                self._autoscale()
+            except Exception as e:
+                logging.error(f"Constraint worker autoscaling failed: {e}")
+
+    def _collect_results(self):
+        while not self._closed:
+            with self._lock:
+                # replaced workers stay here until their pipe reports EOF and can be closed
+                readers = {
+                    w.result_reader: w for w in list(self._workers.values()) + self._retired
+                    if not w.result_reader.closed}
+            for conn in wait(list(readers) + [self._wake_reader]):
+                if conn is self._wake_reader:
+                    conn.recv()
+                    continue
+                worker = readers[conn]
+                # take whatever the worker has already answered in one go
+                results = []
+                try:
+                    while True:
+                        request_id, status, value = conn.recv()
+                        if isinstance(value, SharedPayload):
+                            value = self._read_shared_result(worker, value)
+                            if isinstance(value, ConstraintWorkerError):
+                                status = "error"
+                        else:
+                            value = decode_payload(value, self._reader)
+                        results.append((request_id, status, value))
+                        if len(results) >= self.window * 4 or not conn.poll():
+                            break
+                except (EOFError, OSError):
+                    self._complete_many(results)
+                    if worker.alive and not self._closed:
+                        logging.error(
+                            f"Constraint worker {worker.worker_id} exited unexpectedly.")
+                    self._fail_worker(worker, ConstraintWorkerError(
+                        f"Constraint worker {worker.worker_id} exited unexpectedly."))
+                    conn.close()
+                    with self._lock:
+                        if worker in self._retired:
+                            self._retired.remove(worker)
+                    continue
+                self._complete_many(results)
+
+    def _read_shared_result(self, worker: _WorkerHandle, payload: SharedPayload):
+        try:
+            return decode_payload(payload, self._reader)
+        except Exception as e:
+            return ConstraintWorkerError(
+                f"Failed to read result from constraint worker {worker.worker_id}: {e}")
+        finally:
+            # hand the segment back so the worker can reuse it for later results
+            with self._lock:
+                try:
+                    worker.cancel_writer.send(payload.name)
+                except OSError:
+                    pass
+
+    def _queue_depth(self, worker: _WorkerHandle):
+        # not every platform can report the size of a multiprocessing queue
+        try:
+            return worker.input_queue.qsize()
+        except (NotImplementedError, OSError, ValueError):
+            return None
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "worker_id": worker.worker_id,
+                    "pid": worker.process.pid,
+                    "alive": worker.alive and worker.process.is_alive(),
+                    "restarts": worker.restarts,
+                    "uptime": time.monotonic() - worker.started_at,
+                    "outstanding": worker.outstanding,
+                    "in_flight": worker.in_flight,
+                    "queue_depth": self._queue_depth(worker),
+                    "loaded": [message_type for message_type, _ in worker.loaded],
+                }
+                for _, worker in sorted(self._workers.items())
+            ]
+
+    def backlog(self):
+        # message_type -> priority -> checks waiting for a worker
+        with self._lock:
+            depths = {}
+            for lane, queues in self._backlog.items():
+                for (message_type, _), queue in queues.items():
+                    lanes = depths.setdefault(message_type, {})
+                    lanes[lane] = lanes.get(lane, 0) + len(queue)
+            return depths
+
+    def health(self):
+        with self._lock:
+            workers_alive = len(self._alive_workers())
+            report = {}
+            for message_type, health in self._health.items():
+                if workers_alive == 0 or health.consecutive_failures >= self.failure_threshold:
+                    status = "failing"
+                elif health.consecutive_failures:
+                    status = "degraded"
+                else:
+                    status = "healthy"
+                report[message_type] = {
+                    "status": status,
+                    "consecutive_failures": health.consecutive_failures,
+                    "total_failures": health.total_failures,
+                    "last_error": health.last_error,
+                    "last_failure": health.last_failure,
+                    "last_success": health.last_success,
+                }
+            return report
+
+    def forget_health(self, message_type: str):
+        with self._lock:
+            self._health.pop(message_type, None)
+
+    def shutdown(self, timeout: float = 5.0):
+        self._closed = True
+        self._stopped.set()
+        self._supervisor.join(timeout)
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.input_queue.put(None)
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        self._wake()
+        self._collector.join(timeout)
+        for worker in workers:
+            self._fail_worker(worker, ConstraintWorkerError(
+                "Constraint worker pool was shut down."))
+        with self._lock:
+            queued = [request_id for queues in self._backlog.values()
+                      for queue in queues.values() for request_id in queue]
+            self._backlog = {lane: OrderedDict() for lane in self._lanes}
+        for request_id in queued:
+            self._complete(request_id, "crashed", ConstraintWorkerError(
+                "Constraint worker pool was shut down."))
+        self._reader.close()
+        self._segments.close()
+        logging.info("Constraint worker pool shut down.")
@@ -1,6 +1,6 @@
 import os
 import logging
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from typing import List, Dict, Optional
 from .schema import Delegation, DelegationStatus
 
@@ -112,3 +112,32 @@ class DelegationRegistry:
         except Exception as e:
             logging.error(f"Error updating delegation status: {e}")
             return False
+
+    def bulk_update_status(self, status_key: str, updates: Dict[str, Dict]) -> int:
+        # one round trip for a whole batch of delegation_id -> status_data updates
+        if not updates:
+            return 0
+        try:
+            operations = [
+                UpdateOne({"delegation_id": delegation_id}, {
+                    "$set": {f"status.{status_key}": DelegationStatus.from_dict(status_data).to_dict()}})
+                for delegation_id, status_data in updates.items()
+            ]
+            result = self.collection.bulk_write(operations, ordered=False)
+            logging.info(
+                f"Delegation statuses updated in bulk: {result.matched_count} of {len(operations)}, Key: {status_key}")
+            return result.matched_count
+        except Exception as e:
+            logging.error(f"Error bulk updating delegation statuses: {e}")
+            raise
+
+    def get_delegations(self, delegation_ids: List[str], fields: List[str] = None) -> List[Dict]:
+        try:
+            projection = {field: 1 for field in fields} if fields else None
+            if projection is not None:
+                projection.update({"_id": 0, "delegation_id": 1})
+            return list(self.collection.find(
+                {"delegation_id": {"$in": list(delegation_ids)}}, projection))
+        except Exception as e:
+            logging.error(f"Error fetching delegations: {e}")
+            raise
@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+from nats.aio.client import Client as NATS
+
+from .db import DelegationRegistry
+
+RESULT_STATUS_KEY = "delegation_result"
+
+
+class DelegationResultCollector:
+    def __init__(self, nats_url: str, subject: str = "delegation_results.>", registry: DelegationRegistry = None,
+                 constraints_manager=None, constraint_message_type: str = "delegation_result",
+                 flush_interval: float = 0.005, max_batch: int = 1000, check_timeout: float = 30.0,
+                 max_retries: int = 5, retry_backoff: float = 0.5, max_retry_backoff: float = 30.0):
+        self.nats_url = nats_url
+        self.subject = subject
+        self.registry = registry or DelegationRegistry()
+        # validates results with check_batch when given; sync and async managers both work
+        self.constraints_manager = constraints_manager
+        self.constraint_message_type = constraint_message_type
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.check_timeout = check_timeout
+        # a result is dropped after this many failed writes, with exponential backoff in between
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        # (delegation_id, sender_subject_id, status_data, attempts), only touched on the collector's loop
+        self._buffer = []
+        self._consecutive_failures = 0
+        self._resume_at = 0.0
+        self._stats = {"received": 0, "invalid": 0, "rejected": 0, "unmatched": 0,
+                       "written": 0, "retried": 0, "failed": 0, "batches": 0}
+        self._ready = threading.Event()
+        self._error = None
+        self._loop = None
+        self._stopping = None
+        self._thread = None
+
+    def start(self, timeout: float = 30.0):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self._run()), name="delegation-result-collector", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(
+                f"Delegation result collector did not connect to NATS within {timeout}s.")
+        if self._error is not None:
+            raise self._error
+
+    def stop(self, timeout: float = 30.0):
+        if self._thread is None:
+            return
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict:
+        return dict(self._stats, buffered=len(self._buffer))
+
+    async def _run(self):
+        nc = NATS()
+        try:
+            await nc.connect(servers=[self.nats_url])
+            self._loop = asyncio.get_running_loop()
+            self._stopping = asyncio.Event()
+
+            async def message_handler(msg):
+                self._on_message(msg.data)
+
+            subscription = await nc.subscribe(self.subject, cb=message_handler)
+        except Exception as e:
+            self._error = ConnectionError(
+                f"Failed to subscribe to '{self.subject}' at {self.nats_url}: {str(e)}")
+            self._ready.set()
+            return
+
+        logging.info(
+            f"Delegation result collector subscribed to '{self.subject}', flushing every {self.flush_interval * 1000:.0f}ms.")
+        self._ready.set()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                await self._flush(nc)
+            # stop taking results, write what arrived without waiting out a backoff while
+            # the connection can still publish the notifications, then close it
+            await subscription.drain()
+            await self._flush(nc, force=True)
+            if self._buffer:
+                self._stats["failed"] += len(self._buffer)
+                logging.error(
+                    f"Dropping {len(self._buffer)} delegation results that could not be written before stopping.")
+                self._buffer = []
+            await nc.drain()
+        finally:
+            if not nc.is_closed:
+                await nc.close()
+
+    def _on_message(self, data: bytes):
+        self._stats["received"] += 1
+        try:
+            message = json.loads(data.decode("utf-8"))
+            # agents publish the same envelope NATSAPI.push_event sends
+            event_data = message.get("event_data", message)
+            delegation_id = event_data["delegation_id"]
+            status_data = event_data.get("data", event_data.get("status_data"))
+            if not isinstance(status_data, dict):
+                raise ValueError("result data must be an object")
+        except Exception as e:
+            self._stats["invalid"] += 1
+            logging.warning(f"Dropping malformed delegation result: {e}")
+            return
+        self._buffer.append(
+            (delegation_id, message.get("sender_subject_id"), status_data, 0))
+
+    def _retry_later(self, batch: List[Tuple[str, str, Dict, int]], error: Exception):
+        retry = [(delegation_id, sender_subject_id, status_data, attempts + 1)
+                 for delegation_id, sender_subject_id, status_data, attempts in batch
+                 if attempts < self.max_retries]
+        dropped = len(batch) - len(retry)
+        # a result counts as retried once, however many attempts it takes
+        self._stats["retried"] += sum(1 for _, _, _, attempts in retry if attempts == 1)
+        self._stats["failed"] += dropped
+        # back at the front, so results for the same delegation stay in arrival order
+        self._buffer = retry + self._buffer
+
+        self._consecutive_failures += 1
+        delay = min(self.max_retry_backoff,
+                    self.retry_backoff * 2 ** (self._consecutive_failures - 1))
+        self._resume_at = time.monotonic() + delay
+        logging.error(
+            f"Failed to process batch of {len(batch)} delegation results, retrying {len(retry)} "
+            f"in {delay:.1f}s and dropping {dropped} after {self.max_retries} retries: {error}")
+
+    async def _flush(self, nc: NATS, force: bool = False):
+        if not force and time.monotonic() < self._resume_at:
+            return
+        # results keep buffering while a batch is written, so batches grow with the load
+        while self._buffer:
+            batch = self._buffer[:self.max_batch]
+            self._buffer = self._buffer[self.max_batch:]
+            try:
+                notifications, counts = await asyncio.get_running_loop().run_in_executor(
+                    None, self._process, batch)
+            except Exception as e:
+                self._retry_later(batch, e)
+                return
+            self._consecutive_failures = 0
+            # counted here on the loop, and only for the attempt that went through
+            for name, count in counts.items():
+                self._stats[name] += count
+
+            for topic, sender_subject_id, event_data in notifications:
+                try:
+                    await nc.publish(topic, json.dumps({
+                        "event_type": "delegation_result",
+                        "event_data": event_data,
+                        "sender_subject_id": sender_subject_id
+                    }).encode("utf-8"))
+                except Exception as e:
+                    logging.error(
+                        f"Failed to push result for delegation {event_data['delegation_id']}: {e}")
+
+    def _validate(self, results: Dict[str, Tuple[str, Dict]]) -> Tuple[List[str], int]:
+        delegation_ids = list(results)
+        if self.constraints_manager is None or not delegation_ids:
+            return delegation_ids, 0
+
+        from constraint_checker.rules import is_rejected
+
+        outputs = self.constraints_manager.check_batch(self.constraint_message_type, [
+            {"delegation_id": delegation_id,
+                "sender_subject_id": results[delegation_id][0], "result": results[delegation_id][1]}
+            for delegation_id in delegation_ids
+        ])
+        if hasattr(outputs, "result"):
+            outputs = outputs.result(self.check_timeout)
+
+        accepted = []
+        for delegation_id, output in zip(delegation_ids, outputs):
+            if is_rejected(output):
+                logging.warning(
+                    f"Delegation result for {delegation_id} rejected by constraint: {output}")
+            else:
+                accepted.append(delegation_id)
+        return accepted, len(delegation_ids) - len(accepted)
+
+    def _process(self, batch: List[Tuple[str, str, Dict, int]]) -> Tuple[List[Tuple[str, str, Dict]], Dict]:
+        # runs on an executor thread, so the stats are returned as counts instead of updated here
+        counts = {"unmatched": 0, "rejected": 0, "written": 0, "batches": 0}
+        delegations = {
+            delegation["delegation_id"]: delegation
+            for delegation in self.registry.get_delegations(
+                {delegation_id for delegation_id, _, _, _ in batch},
+                ["task_id", "sub_task_id", "sender_subject_id", "target_subject_id"])
+        }
+
+        # the bulk write is unordered, so only the latest result per delegation is kept
+        results = {}
+        for delegation_id, sender_subject_id, status_data, _ in batch:
+            delegation = delegations.get(delegation_id)
+            # only the subject the task was delegated to may submit its result
+            if delegation is None or not sender_subject_id or sender_subject_id != delegation.get("target_subject_id"):
+                counts["unmatched"] += 1
+                logging.warning(
+                    f"Dropping result for unknown delegation or missing or wrong subject: {delegation_id}")
+                continue
+            results[delegation_id] = (sender_subject_id, status_data)
+
+        accepted, counts["rejected"] = self._validate(results)
+        updates = {delegation_id: results[delegation_id][1]
+                   for delegation_id in accepted}
+        if not updates:
+            return [], counts
+        counts["written"] = self.registry.bulk_update_status(
+            RESULT_STATUS_KEY, updates)
+        counts["batches"] = 1
+
+        return [
+            (f"{delegations[delegation_id]['sender_subject_id']}__{delegation_id}",
+             delegations[delegation_id]["target_subject_id"], {
+                 "task_id": delegations[delegation_id].get("task_id"),
+                 "sub_task_id": delegations[delegation_id].get("sub_task_id"),
+                 "delegation_id": delegation_id,
+                 "data": status_data
+            })
+            for delegation_id, status_data in updates.items()
+        ], counts
+
+
+def run_collector():
+    constraints_manager = None
+    dsl_workflow_id = os.getenv("DELEGATION_RESULT_CONSTRAINT_DSL_ID")
+    if dsl_workflow_id:
+        from constraint_checker import new_async_constraints_manager
+        constraints_manager = new_async_constraints_manager()
+        constraints_manager.load(
+            "delegation_result", "delegation_service", dsl_workflow_id)
+
+    collector = DelegationResultCollector(
+        nats_url=os.getenv("ORG_NATS_URL"),
+        subject=os.getenv("DELEGATION_RESULTS_SUBJECT",
+                          "delegation_results.>"),
+        constraints_manager=constraints_manager,
+        flush_interval=float(
+            os.getenv("DELEGATION_RESULT_FLUSH_MS", "5")) / 1000,
+        max_batch=int(os.getenv("DELEGATION_RESULT_MAX_BATCH", "1000")),
+    )
+    collector.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.stop()
+        if constraints_manager is not None:
+            constraints_manager.shutdown()
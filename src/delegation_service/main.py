@@ -1,4 +1,9 @@
+import sys
 from core.apis import run_server
 
 if __name__ == "__main__":
-    run_server()
+    if "--collector" in sys.argv:
+        from core.result_collector import run_collector
+        run_collector()
+    else:
+        run_server()